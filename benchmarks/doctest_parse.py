@@ -0,0 +1,179 @@
+"""
+    Compares the serial and parallel parsing of a doctest output file
+    by mantiddoc.doctest.DocTestOutputParser.
+
+    A synthetic output file is generated from a mix of passing, failing
+    and partially failing documents, parsed both ways and the results
+    checked for equality before the timings are printed.
+
+    Usage:
+      python benchmarks/doctest_parse.py [--size-mb 300] [--nprocs 4]
+
+    The number of CPUs of the host is printed with the timings. The parser
+    uses at most one process per CPU, so on a host with fewer CPUs than
+    --nprocs the parallel timing is of fewer processes, or of the serial
+    parse on a single CPU.
+
+    Recorded runs
+    ~~~~~~~~~~~~~
+
+     - 1 CPU, Python 2.7.18, --size-mb 50 --nprocs 2, before the number of
+       processes was capped: serial 4.64s, parallel 7.30s (0.6x).
+     - 1 CPU, Python 2.7.18, --size-mb 50 --nprocs 2, capped: serial 3.55s,
+       parallel 4.12s, both parsing serially, so the difference is noise.
+     - Multi-core: not yet recorded, no such host was available. Until one
+       is, doctest_xunit_parse_processes is not known to be a speedup.
+"""
+import argparse
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "sphinxext"))
+from mantiddoc.doctest import DocTestOutputParser
+
+ALL_PASSED = """
+Document: %(name)s
+----------%(underline)s
+2 items passed all tests:
+   1 tests in Ex2
+   2 tests in default
+3 tests in 2 items.
+3 passed and 0 failed.
+Test passed.
+"""
+
+ALL_FAILED = """
+Document: %(name)s
+----------%(underline)s
+**********************************************************************
+File "%(name)s.rst", line 127, in Ex2
+Failed example:
+    print "Multi-line failed"
+    print "test"
+Expected:
+    No match
+Got:
+    Multi-line failed
+    test
+**********************************************************************
+File "%(name)s.rst", line 111, in Ex1
+Failed example:
+    print "Single line failed test"
+Expected:
+    No match
+Got:
+    Single line failed test
+**********************************************************************
+2 items had failures:
+   1 of   1 in Ex1
+   1 of   1 in Ex2
+2 tests in 2 items.
+0 passed and 2 failed.
+***Test Failed*** 2 failures.
+"""
+
+MIX_PASS_FAIL = """
+Document: %(name)s
+----------%(underline)s
+**********************************************************************
+File "%(name)s.rst", line 127, in default
+Failed example:
+    print "A failed test"
+Expected:
+    Not a success
+Got:
+    A failed test
+**********************************************************************
+File "%(name)s.rst", line 143, in Ex1
+Failed example:
+    print "Second failed test"
+Expected:
+    Not a success again
+Got:
+    Second failed test
+1 items passed all tests:
+    1 tests in Ex3
+**********************************************************************
+2 items had failures:
+   1 of   1 in Ex1
+   1 of   2 in default
+4 tests in 3 items.
+2 passed and 2 failed.
+***Test Failed*** 2 failures.
+"""
+
+SUMMARY = """
+Doctest summary
+===============
+    0 tests
+    0 failures in tests
+    0 failures in setup code
+    0 failures in cleanup code
+"""
+
+def generate(filename, size_mb):
+    """
+    Write a doctest output file of roughly the given size
+    """
+    templates = [ALL_PASSED, ALL_FAILED, MIX_PASS_FAIL]
+    limit = size_mb * 1024 * 1024
+    written, index = 0, 0
+    with open(filename, "w") as output:
+        output.write("Results of doctest builder run\n")
+        while written < limit:
+            name = "algorithms/Generated%d" % index
+            text = templates[index % len(templates)] % \
+                   {"name": name, "underline": "-" * len(name)}
+            output.write(text)
+            written += len(text)
+            index += 1
+        output.write(SUMMARY)
+    return index
+
+def case_tuples(parser):
+    return [(case.classname, case.name, case.failure_descr)
+            for case in parser.testsuite.testcases]
+
+def main():
+    cmdline = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    cmdline.add_argument("--size-mb", type=int, default=300)
+    cmdline.add_argument("--nprocs", type=int, default=4)
+    args = cmdline.parse_args()
+
+    handle, filename = tempfile.mkstemp(suffix=".txt")
+    os.close(handle)
+    try:
+        ncpus = multiprocessing.cpu_count()
+        print("Host: %d CPU(s), Python %s" % (ncpus, platform.python_version()))
+        nprocs = min(args.nprocs, ncpus)
+        if nprocs < args.nprocs:
+            print("Warning: fewer CPUs than processes, the parallel parse "
+                  "uses %d process(es) on this host" % nprocs)
+        ndocs = generate(filename, args.size_mb)
+        print("Generated %d documents (%.1f MB)"
+              % (ndocs, os.path.getsize(filename) / 1024. / 1024.))
+
+        start = time.time()
+        serial = DocTestOutputParser(filename)
+        serial_time = time.time() - start
+
+        start = time.time()
+        parallel = DocTestOutputParser(filename, nprocs=args.nprocs)
+        parallel_time = time.time() - start
+
+        if case_tuples(serial) != case_tuples(parallel):
+            raise RuntimeError("Serial and parallel results differ")
+        print("Parsed %d test cases" % serial.testsuite.ntests)
+        print("Serial:   %.2fs" % serial_time)
+        print("Parallel: %.2fs (%d processes, %.1fx)"
+              % (parallel_time, nprocs, serial_time / parallel_time))
+    finally:
+        os.remove(filename)
+
+if __name__ == "__main__":
+    main()
@@ -30,7 +30,7 @@ sys.path.insert(0, os.path.abspath('../sphinxext'))
 extensions = ['sphinx.ext.mathjax', 'sphinx.ext.viewcode',
               'sphinx.ext.doctest',
               'mantiddoc.algorithm', 'mantiddoc.categories',
-              'mantiddoc.doctest']
+              'mantiddoc.doctest', 'mantiddoc.envstate', 'mantiddoc.images']
 
 # Add any paths that contain templates here, relative to this directory.
 templates_path = ['_templates']
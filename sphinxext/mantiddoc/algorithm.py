@@ -5,20 +5,44 @@ It pulls out the algorithm summary and the properties table
 from docutils import nodes, statemachine
 from docutils.parsers.rst import directives
 from docutils.parsers.rst import Directive
+from sphinx.domains import Domain, ObjType
+from sphinx.util.nodes import make_refnode
+from algsearch import (SEARCH_DIR, SCRIPT_FILE, build_shards, write_shards,
+                       write_script)
+from util import load_cache
+from hashlib import md5
+import os
+import shelve
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+# Name of the database, relative to the doctree directory, that stores the
+# rendered page headers between builds. The dbm module in use may add a
+# suffix
+HEADER_CACHE_FILE = "algorithm-headers.db"
+# Value of the :version: option that puts every version on a single page
+ALL_VERSIONS = "all"
+# Prefix of the reference targets created for algorithm pages
+TARGET_PREFIX = "algm-"
 
 #------------------------------------------------------------------------------
-# The '_%(name)' will be converted to something like _Rebin, which creates an
-# item that can be referenced internally using the  sphinx ext :ref:`Rebin`
+# The targets will be converted to something like _algm-Rebin-v1, which creates
+# an item that can be referenced internally using the sphinx ext :ref:`algm-Rebin-v1`.
+# The latest version is also given the unversioned _algm-Rebin target
 #
 HEADER_TEMPLATE = \
 """
-.. _algm-%(name)s:
+%(targets)s
 
 %(underline)s
-%(name)s
+%(title)s
 %(underline)s
 %(summary)s
 
+%(versionlinks)s
+
 Aliases
 -------
 %(aliases)s
@@ -39,13 +63,360 @@ class Rebin(object):
     def alias(self):
         return "rebin"
 
+    def getProperties(self):
+        return []
+
+################################################
+
+class HeaderCache(object):
+    """
+    Stores the rendered page header for each algorithm between builds.
+    An entry is only reused while the key computed from the algorithm
+    metadata and the header template is unchanged.
+
+    The cache lives in a database in the doctree directory rather than the
+    environment so that it survives a fresh environment, e.g. sphinx-build -E,
+    and adds nothing to the pickled environment that is loaded at the start
+    of every build. The database is only opened when an entry is first
+    needed and entries are read individually.
+    """
+
+    def __init__(self, filename):
+        """
+        Args:
+          filename (str): Path to the database that stores the cache
+        """
+        self.filename = filename
+        self._shelf = None
+
+    def get(self, name, key):
+        """
+        Returns the cached header text for the named algorithm or None
+        if it is not cached or was rendered from different inputs
+        """
+        entry = load_cache(lambda: self._open().get(_shelf_key(name)), None)
+        if entry is not None and entry[0] == key:
+            return entry[1]
+        return None
+
+    def set(self, name, key, text):
+        """
+        Store the header text for the named algorithm
+        """
+        self._open()[_shelf_key(name)] = (key, text)
+
+    def save(self):
+        """
+        Write any changes to the database and close it
+        """
+        if self._shelf is not None:
+            self._shelf.close()
+            self._shelf = None
+
+    def _open(self):
+        """
+        Returns the open database, opening it if necessary. A database that
+        cannot be opened is replaced with an empty one
+        """
+        if self._shelf is None:
+            try:
+                self._shelf = shelve.open(self.filename,
+                                          protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                self._shelf = shelve.open(self.filename, flag='n',
+                                          protocol=pickle.HIGHEST_PROTOCOL)
+        return self._shelf
+
+def _shelf_key(name):
+    """
+    Returns the name as the byte string that dbm databases require on
+    Python 2
+    """
+    if not isinstance(name, str):
+        name = name.encode("utf-8")
+    return name
+
+#------------------------------------------------------------------------------
+
+class AlgorithmVersions(object):
+    """
+    The registered versions of a single algorithm along with the metadata
+    of those that have been requested. The version numbers are kept in
+    ascending order and act as the index used to build the navigation
+    between versions. The metadata of a version is only fetched when it
+    is first requested.
+    """
+
+    def __init__(self, name, versions, loader=None):
+        """
+        Args:
+          name (str): The name of the algorithm
+          versions (list): The registered version numbers
+          loader: Function of (name, version) that returns the metadata
+                  snapshot of a version. Defaults to get_algorithm_metadata
+        """
+        self.name = name
+        self.versions = sorted(versions)
+        self.metadata = {}
+        self._loader = loader or get_algorithm_metadata
+
+    @property
+    def latest(self):
+        return self.versions[-1]
+
+    def get(self, version=None):
+        """
+        Returns the metadata snapshot of the given version
+
+        Args:
+          version (int): The version required. Defaults to the latest
+        """
+        if version is None:
+            version = self.latest
+        metadata = self.metadata.get(version)
+        if metadata is None:
+            if version not in self.versions:
+                raise ValueError("Algorithm '%s' has no version %d. "
+                                 "Registered versions: %s"
+                                 % (self.name, version, self.versions))
+            metadata = self._loader(self.name, version)
+            self.metadata[version] = metadata
+        return metadata
+
+class MetadataCache(object):
+    """
+    Holds the metadata of each algorithm requested during a build. The
+    registry of algorithm versions is fetched in one call when first
+    needed and serves as the index of each algorithm's versions. The
+    metadata of a version is fetched the first time a page needs it,
+    so later requests for it are simple lookups.
+    """
+
+    def __init__(self):
+        self._registry = None
+        self._algorithms = {}
+
+    def versions(self, algorithm_name):
+        """
+        Returns the AlgorithmVersions object for the named algorithm
+
+        Args:
+          algorithm_name (str): The name of the algorithm
+        """
+        algorithm = self._algorithms.get(algorithm_name)
+        if algorithm is None:
+            algorithm = AlgorithmVersions(algorithm_name,
+                                          self._registered_versions(algorithm_name))
+            self._algorithms[algorithm_name] = algorithm
+        return algorithm
+
+    def _registered_versions(self, algorithm_name):
+        """
+        Returns the list of registered versions of the named algorithm.
+        Algorithms missing from the registry are assumed to have a
+        single version
+        """
+        if self._registry is None:
+            #from mantid.api import AlgorithmFactory
+            self._registry = {} #AlgorithmFactory.getRegisteredAlgorithms(True)
+        return self._registry.get(algorithm_name, [1])
+
+#------------------------------------------------------------------------------
+
+def get_algorithm_metadata(algorithm_name, version=1):
+    """
+    Returns a snapshot of the metadata of the named algorithm that is
+    used to build its page header.
+
+    Args:
+      algorithm_name (str): The name of the algorithm
+      version (int): The version of the algorithm
+
+    Returns:
+      dict: The summary, aliases & properties along with the algorithm object
+    """
+    #from mantid.api import AlgorithmManager # will only happen once
+    alg = Rebin() #AlgorithmManager.createUnmanaged(algorithm_name, version)
+    alg.initialize()
+    properties = []
+    for prop in alg.getProperties():
+        properties.append((prop.name, str(prop.direction), prop.type,
+                           str(prop.getDefault), prop.documentation))
+    return {"name" : algorithm_name,
+            "version" : version,
+            "summary" : alg.getWikiSummary(),
+            "aliases" : alg.alias(),
+            "properties" : tuple(properties),
+            "algorithm" : alg}
+
+def metadata_hash(metadata, *extra):
+    """
+    Returns a hash of the given metadata snapshot that is stable between
+    runs. The algorithm object itself is not part of the hash.
+
+    Args:
+      metadata (dict): A snapshot from get_algorithm_metadata
+      extra: Any further strings to include in the hash, e.g. a template
+    """
+    items = sorted((key, value) for key, value in metadata.items()
+                   if key != "algorithm")
+    digest = md5(repr(items).encode('utf-8'))
+    for text in extra:
+        digest.update(text.encode('utf-8'))
+    return digest.hexdigest()
+
+def header_key(algorithm, version, all_versions):
+    """
+    Returns the key of the rendered header for a single version of an
+    algorithm. It covers everything the header text is built from.
+
+    Args:
+      algorithm (AlgorithmVersions): The versions of the algorithm
+      version (int): The version being rendered
+      all_versions (bool): True if every version is on the same page
+    """
+    return metadata_hash(algorithm.get(version), HEADER_TEMPLATE,
+                         repr(algorithm.versions), repr(all_versions))
+
+def page_fingerprint(algorithm, version_option):
+    """
+    Returns the fingerprint of an algorithm page given the value of
+    its :version: option. It is the raw 16 byte digest as it is stored
+    in the environment for every algorithm page
+
+    Args:
+      algorithm (AlgorithmVersions): The versions of the algorithm
+      version_option: None, a version number or ALL_VERSIONS
+    """
+    all_versions = (version_option == ALL_VERSIONS)
+    if all_versions:
+        versions = algorithm.versions
+    elif version_option is None:
+        versions = [algorithm.latest]
+    else:
+        versions = [version_option]
+    digest = md5()
+    for version in versions:
+        digest.update(header_key(algorithm, version,
+                                 all_versions).encode('utf-8'))
+    return digest.digest()
+
+def version_option(argument):
+    """
+    Converts the value of the :version: option. It is either a positive
+    version number or 'all'
+    """
+    if argument and argument.strip().lower() == ALL_VERSIONS:
+        return ALL_VERSIONS
+    return directives.positive_int(argument)
+
+def split_aliases(aliases):
+    """
+    Returns the list of names from the string given by an algorithm's
+    alias method. Several aliases can be separated by commas
+    """
+    if not aliases:
+        return []
+    return [alias.strip() for alias in aliases.split(",") if alias.strip()]
+
+################################################
+
+class AlgorithmDomain(Domain):
+    """
+    Keeps an index of the targets of every algorithm page. The names,
+    aliases and versioned names of each algorithm are stored in lower
+    case so that a reference can be resolved with a single lookup.
+    The name, summary and aliases shown on each page are also kept for
+    the algorithm search index.
+    """
+    name = "algm"
+    label = "Algorithms"
+    object_types = {'algorithm': ObjType('algorithm', 'algorithm')}
+    # Incremented when the layout of the data changes so that an
+    # environment holding the old layout is discarded
+    data_version = 2
+    initial_data = {
+        'targets': {}, # lower case name -> (docname, labelid, display name)
+        'names': {}, # docname -> lower case names of its targets
+        'pages': {}, # docname -> (name, summary, aliases)
+    }
+
+    def add_target(self, name, docname, labelid, dispname):
+        """
+        Add a name that refers to the given target
+
+        Args:
+          name (str): An algorithm name, alias or versioned name
+          docname (str): The document that holds the target
+          labelid (str): The id of the target within the document
+          dispname (str): Text to display for references to the target
+        """
+        name = name.lower()
+        self.data['targets'][name] = (docname, labelid, dispname)
+        self.data['names'].setdefault(docname, []).append(name)
+
+    def add_page(self, docname, name, summary, aliases):
+        """
+        Record the algorithm described by a page
+
+        Args:
+          docname (str): The document of the page
+          name (str): The name of the algorithm
+          summary (str): The summary of the algorithm
+          aliases (list): The aliases of the algorithm
+        """
+        self.data['pages'][docname] = (name, summary, tuple(aliases))
+
+    def find_target(self, name):
+        """
+        Returns the (docname, labelid, dispname) tuple for the given
+        name or None if it is unknown. The name is case-insensitive
+        """
+        return self.data['targets'].get(name.lower())
+
+    def clear_doc(self, docname):
+        """
+        Remove the targets of a document. Only the names that it added are
+        looked at, so this does not depend on the number of targets
+        """
+        targets = self.data['targets']
+        for name in self.data['names'].pop(docname, ()):
+            # the name may have been taken over by a later document
+            entry = targets.get(name)
+            if entry is not None and entry[0] == docname:
+                del targets[name]
+        self.data['pages'].pop(docname, None)
+
+    def merge_domaindata(self, docnames, otherdata):
+        """
+        Merge in the targets read by a parallel reading process
+        """
+        targets = self.data['targets']
+        for name, entry in otherdata['targets'].items():
+            if entry[0] in docnames:
+                targets[name] = entry
+        for docname, names in otherdata['names'].items():
+            if docname in docnames:
+                self.data['names'][docname] = names
+        for docname, entry in otherdata['pages'].items():
+            if docname in docnames:
+                self.data['pages'][docname] = entry
+
+    def get_objects(self):
+        for name, (docname, labelid, dispname) in self.data['targets'].items():
+            # Only the canonical names are listed. Aliases are for lookup
+            if labelid == nodes.make_id(TARGET_PREFIX + name):
+                yield (dispname, dispname, 'algorithm', docname, labelid, 1)
+
 ################################################
 
 class AlgorithmDirective(Directive):
     """
     Insert additional reST text for an algorithm preamble
 
-    The algorithm name is a the single required argument.
+    The algorithm name is a the single required argument. The
+    :version: option selects a version other than the latest or,
+    given 'all', writes out a section for each version.
     """
 
     required_arguments = 1
@@ -53,7 +424,8 @@ class AlgorithmDirective(Directive):
     final_argument_whitespace = True
     option_spec = {'file': directives.path,
                    'url': directives.uri,
-                   'encoding': directives.encoding}
+                   'encoding': directives.encoding,
+                   'version': version_option}
     has_content = True
 
     def run(self):
@@ -62,30 +434,166 @@ class AlgorithmDirective(Directive):
         directive is encountered
         """
         algname = str(self.arguments[0])
-        rawtext = self._create_page_header(algname)
+        version = self.options.get('version')
+        algorithm = self._metadata_cache().versions(algname)
+        if version == ALL_VERSIONS:
+            versions = reversed(algorithm.versions)
+        elif version is None:
+            versions = [algorithm.latest]
+        elif version in algorithm.versions:
+            versions = [version]
+        else:
+            raise self.error("Algorithm '%s' has no version %d. "
+                             "Registered versions: %s"
+                             % (algname, version, algorithm.versions))
+        self._record_fingerprint(algname, version,
+                                 page_fingerprint(algorithm, version))
+        self._register_targets(algorithm, version)
+
+        all_versions = (version == ALL_VERSIONS)
+        rawtext = ""
+        for number in versions:
+            rawtext += self._create_page_header(algorithm, number,
+                                                all_versions)
         tab_width = 4
         include_lines = statemachine.string2lines(rawtext, tab_width,
                                                   convert_whitespace=True)
         self.state_machine.insert_input(include_lines, "")
         return []
 
-    def _create_page_header(self, algorithm_name):
+    def _create_page_header(self, algorithm, version, all_versions):
         """
-        Return the page header for the named algorithm
+        Return the page header for a version of an algorithm. The text
+        is taken from the header cache if neither the algorithm metadata
+        nor the template have changed since it was last rendered
+
+        Args:
+          algorithm (AlgorithmVersions): The versions of the algorithm
+          version (int): The version to render
+          all_versions (bool): True if every version is on this page
         """
-        #from mantid.api import AlgorithmManager # will only happen once
-        alg = Rebin() #AlgorithmManager.createUnmanaged(algorithm_name)
-        alg.initialize()
-        summary = alg.getWikiSummary()
-        
-        rawtext = HEADER_TEMPLATE % {"name" : algorithm_name,
-                                     "underline" : "-" * len(algorithm_name),
-                                     "summary" : alg.getWikiSummary(),
-                                     "aliases" : alg.alias(),
+        name = algorithm.name
+        cache_name = "%s-v%d" % (name, version)
+        cache = self._header_cache()
+        key = header_key(algorithm, version, all_versions)
+        if cache is not None:
+            rawtext = cache.get(cache_name, key)
+            if rawtext is not None:
+                return rawtext
+
+        metadata = algorithm.get(version)
+        targets = [".. _algm-%s:" % cache_name]
+        if version == algorithm.latest:
+            targets.append(".. _algm-%s:" % name)
+        if all_versions:
+            title = "%s v.%d" % (name, version)
+        else:
+            title = name
+        alg = metadata["algorithm"]
+        links = self._create_version_links(algorithm, version)
+        rawtext = HEADER_TEMPLATE % {"targets" : "\n".join(targets),
+                                     "title" : title,
+                                     "underline" : "-" * len(title),
+                                     "summary" : metadata["summary"],
+                                     "versionlinks" : links,
+                                     "aliases" : metadata["aliases"],
                                      "proptable" : self._create_prop_table(alg)
                                     }
+        if cache is not None:
+            cache.set(cache_name, key, rawtext)
         return rawtext
 
+    def _create_version_links(self, algorithm, version):
+        """
+        Return reST linking to the other versions of the algorithm. The
+        links are built from the version index alone.
+
+        Args:
+          algorithm (AlgorithmVersions): The versions of the algorithm
+          version (int): The version being rendered
+        """
+        if len(algorithm.versions) < 2:
+            return ""
+        links = []
+        for other in algorithm.versions:
+            if other == version:
+                links.append("v.%d" % other)
+            else:
+                links.append(":ref:`v.%d <algm-%s-v%d>`"
+                             % (other, algorithm.name, other))
+        return "Versions: " + " | ".join(links) + "\n"
+
+    def _record_fingerprint(self, algorithm_name, version, fingerprint):
+        """
+        Store the fingerprint of the metadata used for the current
+        document so that check_algorithms_outdated can tell when the
+        algorithm changes without the document source changing.
+
+        Args:
+          algorithm_name (str): The name of the algorithm on this page
+          version: The value of the :version: option
+          fingerprint (str): Hash of the metadata & header template
+        """
+        env = self.state.document.settings.env
+        if not hasattr(env, "algorithm_fingerprints"):
+            env.algorithm_fingerprints = {}
+        env.algorithm_fingerprints[env.docname] = (algorithm_name, version,
+                                                   fingerprint)
+
+    def _register_targets(self, algorithm, version):
+        """
+        Add the targets on this page to the algorithm domain index so
+        that references to aliases, versions or names in any case can
+        be resolved by resolve_algorithm_reference
+
+        Args:
+          algorithm (AlgorithmVersions): The versions of the algorithm
+          version: The value of the :version: option
+        """
+        env = self.state.document.settings.env
+        domain = env.get_domain(AlgorithmDomain.name)
+        if version == ALL_VERSIONS:
+            versions = algorithm.versions
+        elif version is None:
+            versions = [algorithm.latest]
+        else:
+            versions = [version]
+        for number in versions:
+            label = "%s%s-v%d" % (TARGET_PREFIX, algorithm.name, number)
+            domain.add_target("%s-v%d" % (algorithm.name, number),
+                              env.docname, nodes.make_id(label),
+                              "%s v.%d" % (algorithm.name, number))
+        if algorithm.latest in versions:
+            label = TARGET_PREFIX + algorithm.name
+            metadata = algorithm.get()
+            names = [algorithm.name] + split_aliases(metadata["aliases"])
+            for name in names:
+                domain.add_target(name, env.docname, nodes.make_id(label),
+                                  algorithm.name)
+        else:
+            metadata = algorithm.get(versions[0])
+        domain.add_page(env.docname, algorithm.name, metadata["summary"],
+                        split_aliases(metadata["aliases"]))
+
+    def _metadata_cache(self):
+        """
+        Returns the MetadataCache attached to the application, creating
+        a private one if there is not one, e.g. outside of a Sphinx build
+        """
+        app = getattr(self.state.document.settings.env, "app", None)
+        cache = getattr(app, "algorithm_metadata", None)
+        if cache is None:
+            cache = MetadataCache()
+        return cache
+
+    def _header_cache(self):
+        """
+        Returns the HeaderCache attached to the application or None
+        if there is not one, e.g. outside of a full Sphinx build
+        """
+        app = getattr(self.state.document.settings.env, "app", None)
+        return getattr(app, "algorithm_header_cache", None)
+
     def _create_prop_table(self, alg):
         """
         Return a string containing the properties table
@@ -93,7 +601,193 @@ class AlgorithmDirective(Directive):
         """
         return ""
 
+#------------------------------------------------------------------------------
+
+def resolve_algorithm_reference(app, env, node, contnode):
+    """
+    Callback for the 'missing-reference' Sphinx event. Resolves
+    references to algm- targets that the standard label lookup
+    could not, e.g. aliases or old-style names.
+
+    Arguments:
+      app: A Sphinx application object
+      env: The build environment
+      node: The pending_xref node to resolve
+      contnode: The markup content of the reference
+
+    Returns:
+      A new reference node or None if the target is unknown
+    """
+    if node.get('reftype') != 'ref':
+        return None
+    target = node['reftarget']
+    if not target.lower().startswith(TARGET_PREFIX):
+        return None
+    domain = env.get_domain(AlgorithmDomain.name)
+    entry = domain.find_target(target[len(TARGET_PREFIX):])
+    if entry is None:
+        return None
+    docname, labelid, dispname = entry
+    if not node.get('refexplicit'):
+        contnode = nodes.emphasis(dispname, dispname)
+    return make_refnode(app.builder, node['refdoc'], docname,
+                        labelid, contnode, dispname)
+
+#------------------------------------------------------------------------------
+
+def check_algorithms_outdated(app, env, added, changed, removed):
+    """
+    Callback for the 'env-get-outdated' Sphinx event. Sphinx only knows
+    that an algorithm page depends on its source file so this compares the
+    fingerprint of each algorithm's current metadata with the one recorded
+    when its page was last read and returns the pages that differ.
+
+    Arguments:
+      app: A Sphinx application object
+      env: The build environment
+      added (set): Names of documents that are new
+      changed (set): Names of documents that have changed
+      removed (set): Names of documents that have been removed
+
+    Returns:
+      list: Names of the additional documents that must be re-read
+    """
+    fingerprints = getattr(env, "algorithm_fingerprints", {})
+    cache = app.algorithm_metadata
+    outdated = []
+    for docname, entry in fingerprints.items():
+        if docname in added or docname in changed or docname in removed:
+            continue
+        algorithm_name, version, fingerprint = entry
+        algorithm = cache.versions(algorithm_name)
+        if version not in (None, ALL_VERSIONS) and \
+                version not in algorithm.versions:
+            outdated.append(docname)
+        elif page_fingerprint(algorithm, version) != fingerprint:
+            outdated.append(docname)
+    if outdated:
+        app.info("%d algorithm page(s) outdated by metadata changes"
+                 % len(outdated))
+    return outdated
+
+def purge_fingerprints(app, env, docname):
+    """
+    Callback for the 'env-purge-doc' Sphinx event. Removes the stored
+    metadata fingerprint of a document that is about to be re-read or
+    has been removed.
+
+    Arguments:
+      app: A Sphinx application object
+      env: The build environment
+      docname (str): Name of the document being purged
+    """
+    fingerprints = getattr(env, "algorithm_fingerprints", None)
+    if fingerprints is not None:
+        fingerprints.pop(docname, None)
+
+def write_algorithm_search(app):
+    """
+    Callback for the 'html-collect-pages' Sphinx event. Writes the search
+    index of algorithm names, aliases, summaries and categories, split
+    into shards by name prefix, to the output directory. Only the shards
+    that have changed are rewritten. No pages are added.
+
+    Arguments:
+      app: A Sphinx application object
+
+    Returns:
+      list: An empty list of pages
+    """
+    length = app.config.algorithm_search_prefix_length
+    if length <= 0:
+        return []
+    env = app.builder.env
+    pages = env.get_domain(AlgorithmDomain.name).data['pages']
+    store = getattr(env, "categories", None)
+    categories = store.document_categories() if store is not None else {}
+    entries = []
+    for docname, (name, summary, aliases) in pages.items():
+        entries.append({"name": name,
+                        "aliases": list(aliases),
+                        "summary": summary,
+                        "categories": categories.get(docname, []),
+                        "uri": app.builder.get_target_uri(docname)})
+    shards = build_shards(entries, length)
+    written, removed = write_shards(os.path.join(app.outdir, SEARCH_DIR),
+                                    shards, length)
+    write_script(os.path.join(app.outdir, "_static"))
+    app.info("algorithm search index: %d shards, %d written, %d removed"
+             % (len(shards), written, removed))
+    return []
+
+def add_algorithm_search_script(app):
+    """
+    Callback for the 'builder-inited' Sphinx event. Adds the script that
+    looks up the algorithm search index to the pages of an HTML builder
+    when the index is enabled.
+
+    Arguments:
+      app: A Sphinx application object
+    """
+    if app.config.algorithm_search_prefix_length <= 0:
+        return
+    scripts = getattr(app.builder, "script_files", None)
+    if scripts is None:
+        return
+    # the list is shared by every builder so only add the script once
+    if "_static/" + SCRIPT_FILE not in scripts:
+        app.add_javascript(SCRIPT_FILE)
+
+def load_header_cache(app):
+    """
+    Callback for the 'builder-inited' Sphinx event. Attaches the cache of
+    rendered page headers in the doctree directory, which is opened when
+    first used.
+
+    Arguments:
+      app: A Sphinx application object
+    """
+    cachefile = os.path.join(app.doctreedir, HEADER_CACHE_FILE)
+    app.algorithm_header_cache = HeaderCache(cachefile)
+
+def create_metadata_cache(app):
+    """
+    Callback for the 'builder-inited' Sphinx event. Attaches an empty
+    MetadataCache to the application for use by the directive and the
+    outdated-document checks.
+
+    Arguments:
+      app: A Sphinx application object
+    """
+    app.algorithm_metadata = MetadataCache()
+
+def save_header_cache(app, exception):
+    """
+    Callback for the 'build-finished' Sphinx event. Writes the cache of
+    rendered page headers back to the doctree directory.
+
+    Arguments:
+      app: A Sphinx application object
+      exception: (Exception): If an exception was raised then it is given here
+    """
+    cache = getattr(app, "algorithm_header_cache", None)
+    if cache is not None:
+        cache.save()
+
 #------------------------------------------------------------------------------
 def setup(app):
     # Add new directive
     app.add_directive('algorithm', AlgorithmDirective)
+    app.add_domain(AlgorithmDomain)
+    # connect events to handlers
+    app.connect("builder-inited", load_header_cache)
+    app.connect("builder-inited", create_metadata_cache)
+    app.connect("builder-inited", add_algorithm_search_script)
+    app.connect("env-get-outdated", check_algorithms_outdated)
+    app.connect("env-purge-doc", purge_fingerprints)
+    app.connect("missing-reference", resolve_algorithm_reference)
+    app.connect("build-finished", save_header_cache)
+    app.connect("html-collect-pages", write_algorithm_search)
+    # number of leading characters of the names that split the algorithm
+    # search index into shards. 0 disables the index
+    app.add_config_value('algorithm_search_prefix_length', 2, False)
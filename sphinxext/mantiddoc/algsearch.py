@@ -0,0 +1,165 @@
+"""
+    Writes a search index of the algorithm pages that is split into shards
+    by the leading characters of each algorithm name and alias, so that a
+    page searching for e.g. "rebin" only has to fetch the shard for "re".
+
+    Output layout
+    ~~~~~~~~~~~~~
+
+    Everything is written to the SEARCH_DIR directory of the output:
+
+     - manifest.json: {"prefix_length": 2, "shards": {"re": "<md5>", ...}}
+       The hash of each shard changes whenever its content does and can be
+       added to the shard's URL to defeat caching of old versions;
+     - <prefix>.json: A list of entries whose name or one of whose aliases
+       starts with the prefix, sorted by name. Each entry is
+       {"name": ..., "aliases": [...], "summary": ..., "categories": [...],
+        "uri": ...} where the uri is relative to the root of the output.
+
+    A prefix is the lower case leading characters of a name with anything
+    other than a letter or digit replaced by an underscore. A query shorter
+    than the prefix length needs every shard in the manifest that starts
+    with it.
+
+    Only shards whose content has changed since they were last written are
+    rewritten and shards that no longer have entries are removed.
+
+    Lookup
+    ~~~~~~
+
+    The SCRIPT_FILE script, shipped in the static directory of this package,
+    is copied to the _static directory of the output. It reads the manifest,
+    computes the prefix of a query in the same way as shard_prefix and
+    fetches only the shards that can match it. Any
+    <input class="algorithm-search"> on a page is wired to it.
+"""
+from hashlib import md5
+import json
+import os
+import re
+
+# Directory, relative to the output directory, holding the index
+SEARCH_DIR = "_algsearch"
+# Name of the file listing the shards
+MANIFEST_FILE = "manifest.json"
+# Name of the script that looks up the index
+SCRIPT_FILE = "algsearch.js"
+# Directory holding the script
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+_NOT_ALNUM = re.compile(r"[^a-z0-9]")
+
+def shard_prefix(term, length):
+    """
+    Returns the prefix of the shard that the term belongs to
+
+    Args:
+      term (str): An algorithm name or alias
+      length (int): The number of leading characters in a prefix
+    """
+    return _NOT_ALNUM.sub("_", term[:length].lower())
+
+def build_shards(entries, length):
+    """
+    Group the entries into shards by the prefixes of their names and aliases
+
+    Args:
+      entries (list): A list of dictionaries as described in the module
+                      documentation
+      length (int): The number of leading characters in a prefix
+
+    Returns:
+      dict: A dictionary of prefix to the JSON text of the shard
+    """
+    shards = {}
+    for entry in entries:
+        prefixes = set(shard_prefix(term, length)
+                       for term in [entry["name"]] + list(entry["aliases"])
+                       if term)
+        for prefix in prefixes:
+            shards.setdefault(prefix, []).append(entry)
+    texts = {}
+    for prefix, members in shards.items():
+        members.sort(key=lambda entry: (entry["name"].lower(), entry["uri"]))
+        texts[prefix] = json.dumps(members, sort_keys=True,
+                                   separators=(",", ":"))
+    return texts
+
+def write_shards(dirname, shards, length):
+    """
+    Write the shards that differ from those listed in any existing manifest
+    in the directory, remove those that are no longer needed and update the
+    manifest
+
+    Args:
+      dirname (str): The directory to write to
+      shards (dict): A dictionary of prefix to JSON text from build_shards
+      length (int): The number of leading characters in a prefix
+
+    Returns:
+      tuple: The number of shards (written, removed)
+    """
+    manifest_file = os.path.join(dirname, MANIFEST_FILE)
+    old_shards, old_hashes = {}, {}
+    if os.path.exists(manifest_file):
+        try:
+            with open(manifest_file) as manifest:
+                old = json.load(manifest)
+            old_shards = old.get("shards", {})
+            # shards of a different length have to be rewritten
+            if old.get("prefix_length") == length:
+                old_hashes = old_shards
+        except (IOError, ValueError):
+            pass
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+
+    hashes = {}
+    written = 0
+    for prefix, text in shards.items():
+        data = text.encode("utf-8")
+        digest = md5(data).hexdigest()
+        hashes[prefix] = digest
+        filename = os.path.join(dirname, prefix + ".json")
+        if old_hashes.get(prefix) == digest and os.path.exists(filename):
+            continue
+        with open(filename, "wb") as shard:
+            shard.write(data)
+        written += 1
+
+    removed = 0
+    for prefix in set(old_shards) - set(hashes):
+        filename = os.path.join(dirname, prefix + ".json")
+        if os.path.exists(filename):
+            os.remove(filename)
+            removed += 1
+
+    if written or removed or hashes != old_hashes:
+        with open(manifest_file, "w") as manifest:
+            json.dump({"prefix_length": length, "shards": hashes}, manifest,
+                      sort_keys=True, separators=(",", ":"))
+    return written, removed
+
+def write_script(dirname):
+    """
+    Copy the lookup script into the directory if it is missing or differs
+
+    Args:
+      dirname (str): The static directory of the output
+
+    Returns:
+      bool: True if the script was written
+    """
+    source = os.path.join(STATIC_DIR, SCRIPT_FILE)
+    target = os.path.join(dirname, SCRIPT_FILE)
+    with open(source, "rb") as script:
+        data = script.read()
+    if os.path.exists(target):
+        with open(target, "rb") as script:
+            if script.read() == data:
+                return False
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    with open(target, "wb") as script:
+        script.write(data)
+    return True
@@ -1,4 +1,27 @@
 from base import BaseDirective
+from util import load_pickle, parallel_map
+from array import array
+from hashlib import md5
+import os
+try:
+    from sphinx.errors import NoUri
+except ImportError:
+    # Sphinx < 1.6 defines it with the environment
+    from sphinx.environment import NoUri
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+# Template for the body of a category page that can be rendered outside of
+# the theme's layout
+CATEGORY_BODY_TEMPLATE = "categorybody.html"
+# Name of the file, relative to the doctree directory, storing the hashes
+# of the category pages written by the last build
+CATEGORY_HASHES_FILE = "category-pages.pickle"
+# Category pages are all written at the top level of the output, as is the
+# page of this name, so a link from any of them to a document is the same
+LINK_BASE_PAGE = "categories"
 
 class PageRef(object):
     """
@@ -8,24 +31,260 @@ class PageRef(object):
     name = None
     # The link to the named page
     link = None
+    # Name of the document that holds the reference
+    docname = None
 
-    def __init__(self, name):
+    def __init__(self, name, docname=None):
         self.name = name
+        self.docname = docname
 #endclass
 
 class Category(object):
     """
-    Store information about a single category
+    Store information about a single category. Members are held as
+    integer IDs from the CategoryStore that owns the category.
     """
     # Displayed name of the category page
     name = None
-    # Collection of Page objects that link to members of the category 
-    pages = []
-    # Collection of Category objects that form subcategories of this category
-    subcategories = []
+    # Document IDs of the pages that are members of the category
+    pages = None
+    # Category IDs of subcategories, paired with the document IDs in
+    # subcategory_docs that declared them
+    subcategories = None
+    subcategory_docs = None
+    # Positions of each document ID in pages & subcategory_docs. They are
+    # built when a document is first removed and are not pickled
+    _page_positions = None
+    _subcategory_positions = None
 
     def __init__(self, name):
         self.name = name
+        self.pages = array("i")
+        self.subcategories = array("i")
+        self.subcategory_docs = array("i")
+
+    def __getstate__(self):
+        return dict((key, value) for key, value in self.__dict__.items()
+                    if not key.startswith("_"))
+
+    def add_page(self, doc_id):
+        """
+        Add the document as a member of the category
+        """
+        if self._page_positions is not None:
+            self._page_positions.setdefault(doc_id, []).append(len(self.pages))
+        self.pages.append(doc_id)
+
+    def add_subcategory(self, category_id, doc_id):
+        """
+        Add a subcategory declared by the given document
+        """
+        if self._subcategory_positions is not None:
+            self._subcategory_positions.setdefault(doc_id, []).append(
+                len(self.subcategory_docs))
+        self.subcategories.append(category_id)
+        self.subcategory_docs.append(doc_id)
+
+    def remove_document(self, doc_id):
+        """
+        Remove the references held by the given document. The cost depends
+        on the number of references removed, not on the size of the category,
+        as each is replaced by the last entry. The order of the members is
+        therefore not kept.
+
+        Args:
+          doc_id (int): The ID of the document
+
+        Returns:
+          bool: True if any reference was removed
+        """
+        if self._page_positions is None:
+            self._page_positions = _positions(self.pages)
+            self._subcategory_positions = _positions(self.subcategory_docs)
+        removed = _remove_positions(self._page_positions, doc_id,
+                                    self.pages, [self.pages])
+        if _remove_positions(self._subcategory_positions, doc_id,
+                             self.subcategory_docs,
+                             [self.subcategories, self.subcategory_docs]):
+            removed = True
+        return removed
+#endclass
+
+def _positions(doc_ids):
+    """
+    Returns a dictionary of each document ID to its positions in the array
+    """
+    positions = {}
+    for index, doc_id in enumerate(doc_ids):
+        positions.setdefault(doc_id, []).append(index)
+    return positions
+
+def _remove_positions(positions, doc_id, doc_ids, arrays):
+    """
+    Remove the entries of a document from parallel arrays by moving the last
+    entry into each place, keeping the positions up to date
+
+    Args:
+      positions (dict): Document ID to its positions in doc_ids
+      doc_id (int): The ID of the document to remove
+      doc_ids (array): The array of document IDs, one of arrays
+      arrays (list): The parallel arrays
+
+    Returns:
+      bool: True if any entry was removed
+    """
+    indices = positions.pop(doc_id, None)
+    if not indices:
+        return False
+    # Later entries first so that none of the document's are moved
+    for index in sorted(indices, reverse=True):
+        last = len(doc_ids) - 1
+        if index != last:
+            moved = positions[doc_ids[last]]
+            moved[moved.index(last)] = index
+            for values in arrays:
+                values[index] = values[last]
+        for values in arrays:
+            values.pop()
+    return True
+
+class CategoryStore(object):
+    """
+    Holds every category in the form that is pickled with the environment.
+    Each document and category name is stored once and referred to by an
+    integer ID so that membership lists are plain arrays of integers.
+    IDs are never reused within an environment.
+    """
+
+    def __init__(self):
+        # Document names indexed by ID & the reverse mapping
+        self.docnames = []
+        self.doc_ids = {}
+        # Category names indexed by ID & the reverse mapping
+        self.names = []
+        self.name_ids = {}
+        # Category objects keyed by name
+        self.categories = {}
+        # IDs of the categories that each document refers to, keyed by
+        # document ID, so that removing a document only visits those
+        self.doc_categories = {}
+        # Names of the categories touched since the pages were last collected
+        self.changed = set()
+
+    def doc_id(self, docname):
+        """
+        Returns the ID of the given document, assigning one if necessary
+        """
+        doc_id = self.doc_ids.get(docname)
+        if doc_id is None:
+            doc_id = len(self.docnames)
+            self.docnames.append(docname)
+            self.doc_ids[docname] = doc_id
+        return doc_id
+
+    def category(self, name):
+        """
+        Returns the Category with the given name, creating it if necessary
+        """
+        category = self.categories.get(name)
+        if category is None:
+            if name not in self.name_ids:
+                self.name_ids[name] = len(self.names)
+                self.names.append(name)
+            category = Category(self.names[self.name_ids[name]])
+            self.categories[name] = category
+        return category
+
+    def add_page(self, name, docname):
+        """
+        Record the document as a member of the named category
+        """
+        doc_id = self.doc_id(docname)
+        self.category(name).add_page(doc_id)
+        self._add_reference(doc_id, name)
+        self.changed.add(name)
+
+    def add_subcategory(self, parent, name, docname):
+        """
+        Record the named category as a subcategory of the parent, as
+        declared by the given document
+        """
+        category = self.category(parent)
+        self.category(name)
+        doc_id = self.doc_id(docname)
+        category.add_subcategory(self.name_ids[name], doc_id)
+        self._add_reference(doc_id, parent)
+        self.changed.add(parent)
+
+    def remove_document(self, docname):
+        """
+        Remove every reference held by the given document. Categories left
+        without members are removed.
+        """
+        doc_id = self.doc_ids.get(docname)
+        if doc_id is None:
+            return
+        for name_id in set(self.doc_categories.pop(doc_id, ())):
+            name = self.names[name_id]
+            category = self.categories.get(name)
+            if category is None or not category.remove_document(doc_id):
+                continue
+            self.changed.add(name)
+            if not category.pages and not category.subcategories:
+                del self.categories[name]
+
+    def _add_reference(self, doc_id, name):
+        """
+        Record that the document refers to the named category
+        """
+        name_ids = self.doc_categories.get(doc_id)
+        if name_ids is None:
+            name_ids = self.doc_categories[doc_id] = array("i")
+        name_ids.append(self.name_ids[name])
+
+    def document_categories(self):
+        """
+        Returns the names of the categories of each document
+
+        Returns:
+          dict: A dictionary of document name to a sorted list of names
+        """
+        members = {}
+        for name, category in self.categories.items():
+            for doc_id in set(category.pages):
+                members.setdefault(self.docnames[doc_id], []).append(name)
+        for names in members.values():
+            names.sort()
+        return members
+
+    def page_refs(self, category, links=None):
+        """
+        Returns a list of PageRef objects for the members of a category,
+        sorted by document name as they are when every page is read in a
+        fresh build
+
+        Args:
+          category (Category): A category from this store
+          links (list): Links to each document indexed by document ID, as
+                        built by resolve_page_links
+        """
+        docnames = self.docnames
+        refs = []
+        for doc_id in sorted(category.pages, key=docnames.__getitem__):
+            docname = self.docnames[doc_id]
+            ref = PageRef(docname.split("/")[-1], docname)
+            if links is not None and doc_id < len(links):
+                ref.link = links[doc_id]
+            refs.append(ref)
+        return refs
+
+    def subcategory_refs(self, category):
+        """
+        Returns a list of PageRef objects for the subcategories of a
+        category, sorted by name
+        """
+        names = set(self.names[cat_id] for cat_id in category.subcategories)
+        return [PageRef(name) for name in sorted(names)]
 #endclass
 
 class CategoriesDirective(BaseDirective):
@@ -80,31 +339,19 @@ class CategoriesDirective(BaseDirective):
         """
         env = self.state.document.settings.env
         if not hasattr(env, "categories"):
-            env.categories = {}
+            env.categories = CategoryStore()
+        store = env.categories
 
         link_rst = ""
         ncategs = 0
         for item in category_list:
-            has_subcat = False
-            if r"\\" in item:            
-                categs = item.split(r"\\")
-                has_subcat = True
-            else:
-                categs = [item]
-            # endif
-
-            print 
-            for index, categ_name in enumerate(categs):
-                if categ_name not in env.categories:
-                    category = Category(categ_name)
-                    env.categories[categ_name] = category
-                else:
-                    category = env.categories[categ_name]
-                #endif
-                category.pages.append(PageRef(page_name))
-                if has_subcat and index > 0:
-                    category.subcategories.append(PageRef(categ_name))
+            parent = None
+            for categ_name in item.split(r"\\"):
+                store.add_page(categ_name, env.docname)
+                if parent is not None:
+                    store.add_subcategory(parent, categ_name, env.docname)
                 #endif
+                parent = categ_name
                 link_rst += ":ref:`%s` | " % categ_name
                 ncategs += 1
             # endfor
@@ -122,6 +369,70 @@ class CategoriesDirective(BaseDirective):
 
 #---------------------------------------------------------------------------------
 
+def purge_categories(app, env, docname):
+    """
+    Callback for the 'env-purge-doc' Sphinx event. Removes the references
+    held by a document that is about to be re-read or has been removed and
+    marks the categories that it belonged to as changed.
+
+    Arguments:
+      app: A Sphinx application object
+      env: The build environment
+      docname (str): The name of the document
+    """
+    if hasattr(env, "categories"):
+        env.categories.remove_document(docname)
+
+def resolve_page_links(app, env):
+    """
+    Callback for the 'env-updated' Sphinx event. Resolves the link from a
+    category page to every document in the categories once, rather than
+    for every category it appears in. The links are kept in
+    app.category_page_links, indexed by document ID. As IDs are never
+    reused, only documents that are new since the last call are resolved.
+    Category pages are only written by the HTML builders so nothing is
+    resolved for the others, e.g. latex, which cannot link to documents.
+
+    Arguments:
+      app: A Sphinx application object
+      env: The build environment
+    """
+    store = getattr(env, "categories", None)
+    if store is None or not hasattr(app.builder, "handle_page"):
+        return
+    links = getattr(app, "category_page_links", None)
+    if links is None:
+        links = app.category_page_links = []
+    builder = app.builder
+    for docname in store.docnames[len(links):]:
+        try:
+            links.append(builder.get_relative_uri(LINK_BASE_PAGE, docname))
+        except NoUri:
+            links.append(None)
+
+def check_categories_format(app, env, added, changed, removed):
+    """
+    Callback for the 'env-get-outdated' Sphinx event. An environment
+    pickled before categories were held in a CategoryStore that indexes the
+    categories of each document cannot be updated so it is replaced and
+    every document re-read.
+
+    Arguments:
+      app: A Sphinx application object
+      env: The build environment
+      added (set): Names of documents that are new
+      changed (set): Names of documents that have changed
+      removed (set): Names of documents that have been removed
+
+    Returns:
+      list: Names of the additional documents that must be re-read
+    """
+    if not hasattr(env, "categories") or \
+            hasattr(env.categories, "doc_categories"):
+        return []
+    app.info("categories stored in an old format, re-reading all documents")
+    env.categories = CategoryStore()
+    return list(env.found_docs - added - changed)
 
 #---------------------------------------------------------------------------------
 
@@ -133,40 +444,141 @@ def html_collect_pages(app):
     Function returns an iterable (pagename, context, html_template),
     where context is a dictionary defining the content that will fill the template
 
+    If app.categories_changed_only is set, as it is by the watch mode, then
+    only the categories touched since the pages were last collected are
+    returned.
+
     Arguments:
       app: A Sphinx application object 
     """
-
-    if not hasattr(app.builder.env, "categories"):
+    env = app.builder.env
+    if not hasattr(env, "categories"):
         return # nothing to do
 
-    for name, context, template in create_category_pages(app):
+    names = None
+    if getattr(app, "categories_changed_only", False):
+        names = env.categories.changed
+    env.categories.changed = set()
+
+    pages = create_category_pages(app, names)
+    if app.config.categories_write_workers > 0:
+        pages = render_category_pages(app, pages,
+                                      app.config.categories_write_workers,
+                                      partial=names is not None)
+    for name, context, template in pages:
         yield (name, context, template)
 
-def create_category_pages(app):
+def create_category_pages(app, names=None):
     """
     Returns an iterable of (category_name, context, "category.html")
 
     Arguments:
       app: A Sphinx application object 
+      names (set): If given, only the categories with these names are
+                   returned
     """
     env = app.builder.env
 
     template = "category.html"
 
-    categories = env.categories
-    for name, category in categories.iteritems():
+    store = env.categories
+    links = getattr(app, "category_page_links", None)
+    for name, category in store.categories.iteritems():
+        if names is not None and name not in names:
+            continue
         context = {}
         context["title"] = category.name
-        context["subcategories"] = category.subcategories
-        context["pages"] = category.pages
+        context["subcategories"] = store.subcategory_refs(category)
+        context["pages"] = store.page_refs(category, links)
 
         yield (name, context, template)
 
+#---------------------------------------------------------------------------------
+
+def render_category_pages(app, pages, nworkers, partial=False):
+    """
+    Renders the body of each category page in a pool of worker processes
+    and returns the pages whose content has changed since they were last
+    written. Each returned context carries the rendered body so that the
+    theme's layout is all that is left for Sphinx to render.
+
+    Arguments:
+      app: A Sphinx application object
+      pages: An iterable of (category_name, context, template) as produced
+             by create_category_pages
+      nworkers (int): The number of worker processes
+      partial (bool): If True the pages are only a subset of the categories
+                      and the stored hashes of the others are kept
+
+    Returns:
+      list: A list of (category_name, context, template) to be written
+    """
+    pages = list(pages)
+    template_dirs = [os.path.join(app.confdir, path)
+                     for path in app.config.templates_path]
+    # Anything else that goes into the final page must also be in the hash.
+    # The HTML configuration includes the theme and its options, while
+    # a change to any template of the theme or templates_path, e.g. an
+    # overridden layout.html, updates the newest template time
+    page_key = getattr(app.builder, "config_hash", "") + \
+               getattr(app.builder, "tags_hash", "")
+    templates = getattr(app.builder, "templates", None)
+    if hasattr(templates, "newest_template_mtime"):
+        page_key += repr(templates.newest_template_mtime())
+
+    jobs = [(template_dirs, context) for _, context, _ in pages]
+    bodies = parallel_map(_render_category_body, jobs, nworkers,
+                          chunksize=max(1, len(jobs) // (4 * nworkers)))
+
+    hashfile = os.path.join(app.doctreedir, CATEGORY_HASHES_FILE)
+    old_hashes = load_pickle(hashfile, {})
+    new_hashes = dict(old_hashes) if partial else {}
+    changed = []
+    for (name, context, template), body in zip(pages, bodies):
+        digest = md5((page_key + body).encode("utf-8")).hexdigest()
+        new_hashes[name] = digest
+        outfile = app.builder.get_outfilename(name)
+        if old_hashes.get(name) == digest and os.path.exists(outfile):
+            continue
+        changed.append((name, {"title": context["title"],
+                               "category_body": body}, template))
+    app.info("%d of %d category pages changed" % (len(changed), len(pages)))
+    with open(hashfile, "wb") as hashes:
+        pickle.dump(new_hashes, hashes, pickle.HIGHEST_PROTOCOL)
+
+    return changed
+
+# Jinja environment of a worker process, created on first use
+_body_environment = None
+
+def _render_category_body(job):
+    """
+    Renders the body of a single category page. Runs in a worker process.
+
+    Arguments:
+      job (tuple): (template_dirs, context)
+
+    Returns:
+      str: The rendered HTML
+    """
+    global _body_environment
+    template_dirs, context = job
+    if _body_environment is None:
+        from jinja2 import Environment, FileSystemLoader
+        _body_environment = Environment(loader=FileSystemLoader(template_dirs))
+    template = _body_environment.get_template(CATEGORY_BODY_TEMPLATE)
+    return template.render(context)
+
 #------------------------------------------------------------------------------
 def setup(app):
     # Add new directive
     app.add_directive('categories', CategoriesDirective)
+    # number of processes used to render category pages. 0 renders them
+    # serially within the Sphinx template engine
+    app.add_config_value('categories_write_workers', 0, False)
     # connect event to handler
     app.connect("html-collect-pages", html_collect_pages)
+    app.connect("env-purge-doc", purge_categories)
+    app.connect("env-get-outdated", check_categories_format)
+    app.connect("env-updated", resolve_page_links)
 
@@ -111,12 +111,37 @@
     2 failures in tests
     0 failures in setup code
     0 failures in cleanup code
+
+    Command line usage
+    ~~~~~~~~~~~~~~~~~~
+
+    The module can also be run outside of Sphinx, with the directory
+    containing the mantiddoc package on the PYTHONPATH, to convert
+    doctest output files or merge XUnit files from several builds:
+
+        python -m mantiddoc.doctest convert -j 8 build*/doctest/output.txt
+        python -m mantiddoc.doctest merge -o TEST-all.xml build*/TEST-doctest.xml
 """
+import copy
+import gzip
+import mmap
+import os
 import re
+import struct
+import sys
+import time
+from util import parallel_map
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
 try:
     import lxml.etree as ElementTree
 except ImportError:
-    import xml.etree.ElementTree as ElementTree
+    try:
+        import xml.etree.cElementTree as ElementTree
+    except ImportError:
+        import xml.etree.ElementTree as ElementTree
 
 # Name of file produced by doctest target. It is assumed that it is created
 # in app.outdir
@@ -128,6 +153,20 @@ XUNIT_OUTPUT = "TEST-doctest.xml"
 TEST_FAILURE_TYPE = "UsageFailure"
 # Package name
 PACKAGE_NAME = "docs"
+# Number of chunks of documents given to each process when parsing in parallel
+CHUNKS_PER_PROCESS = 4
+# Suffix added to the XUnit filename for the file of full failure descriptions
+# used when the descriptions in the XUnit file are truncated
+FAILURES_SUFFIX = ".failures.txt"
+# Name of the database, in the output directory, storing the history of
+# test results
+HISTORY_FILE = "doctest-history.sqlite"
+# The counters of a doctest builder that are summed over documents
+BUILDER_COUNTERS = ("total_failures", "total_tries", "setup_failures",
+                    "setup_tries", "cleanup_failures", "cleanup_tries")
+# Global namespace produced by running the global setup code once in the
+# parent process when documents are run in forked processes
+WARM_GLOBALS = {}
 
 #-------------------------------------------------------------------------------
 # Define parts of lines that denote a document
@@ -140,8 +179,8 @@ ALLPASS_TEST_NAMES_RE = re.compile(r"^\s+(\d+) tests in (.+)$")
 NUMBER_PASSED_RE = re.compile(r"^(\d+) items passed all tests:$")
 
 TEST_FAILED_END_RE = re.compile(r"\*\*\*Test Failed\*\*\* (\d+) failures.")
-FAILURE_LOC_RE = re.compile(r'^File "([\w/\.]+)", line (\d+), in (\w+)$')
-MIX_FAIL_RE = re.compile(r'^\s+(\d+)\s+of\s+(\d+)\s+in\s+(\w+)$')
+FAILURE_LOC_RE = re.compile(r'^File "([\w/\.]+)", line (\d+), in (.+)$')
+MIX_FAIL_RE = re.compile(r'^\s+(\d+)\s+of\s+(\d+)\s+in\s+(.+)$')
 
 #-------------------------------------------------------------------------------
 class TestSuiteReport(object):
@@ -164,28 +203,57 @@ class TestSuiteReport(object):
             else: return fails
         return reduce(sum_failure, self.testcases, 0)
 
+    @property
+    def nerrors(self):
+        def sum_error(errors, case):
+            if case.errored: return errors + 1
+            else: return errors
+        return reduce(sum_error, self.testcases, 0)
+
     @property
     def npassed(self):
-        return self.ntests - self.nfailed
+        return self.ntests - self.nfailed - self.nerrors
 
 #-------------------------------------------------------------------------------
 class TestCaseReport(object):
 
-    def __init__(self, classname, name, failure_descr):
+    def __init__(self, classname, name, failure_descr, error_type=None,
+                 error_descr=""):
         self.classname = classname
         self.name = name
-        if failure_descr is not None:
-            self.failure_descr = failure_descr
+        # An error, such as a timeout, that stopped the case from completing
+        self.error_type = error_type
+        self.error_descr = error_descr
+        # The first line gives the location of the failure and is unique
+        # to the case. The body is often shared by many cases so is kept
+        # separately to allow it to be interned
+        if failure_descr:
+            location, _, body = failure_descr.partition("\n")
+            self.failure_location = location
+            self.failure_body = body
         else:
-            self.failure_descr = ""
+            self.failure_location = ""
+            self.failure_body = ""
+        # Time taken in seconds, if known
+        self.time = None
+
+    @property
+    def failure_descr(self):
+        if self.failure_body:
+            return self.failure_location + "\n" + self.failure_body
+        return self.failure_location
 
     @property
     def passed(self):
-        return (self.failure_descr == "")
+        return not (self.failed or self.errored)
 
     @property
     def failed(self):
-        return not self.passed
+        return (self.failure_location != "" or self.failure_body != "")
+
+    @property
+    def errored(self):
+        return self.error_type is not None
 
 #-------------------------------------------------------------------------------
 class DocTestOutputParser(object):
@@ -194,7 +262,8 @@ class DocTestOutputParser(object):
     to a different format
     """
 
-    def __init__(self, doctest_output, isfile = True):
+    def __init__(self, doctest_output, isfile = True, nprocs = 1,
+                 errors = None):
         """
         Parses the given doctest output
 
@@ -203,21 +272,65 @@ class DocTestOutputParser(object):
                                 text or a filename
           isfile (bool): If True then the doctest_output argument is treated
                           as a filename
+          nprocs (int): If greater than 1 and the output is a file then the
+                        file is split at document boundaries and the pieces
+                        are parsed by this many processes. It is capped at
+                        the number of CPUs as processes sharing a CPU only
+                        slow the parse down
+          errors (list): A list of (classname, name, error type, description)
+                         for errors, such as an exceeded limit, that stopped
+                         tests from running to completion. A test case is
+                         added for each, so the output need not contain any
+                         complete document when these are given.
         """
-        if isfile:
+        nprocs = min(nprocs, _cpu_count())
+        if isfile and nprocs > 1:
+            cases = self.__parse_parallel(doctest_output, nprocs)
+        elif isfile:
             with open(doctest_output,'r') as results:
-                self.testsuite = self.__parse(results)
+                cases = self.__parse(results)
         else:
-            self.testsuite = self.__parse(doctest_output.splitlines())
+            # Split only on newlines, as iterating over a file does, so a
+            # carriage return within a line, e.g. from progress output, is
+            # kept in the same way by the serial and parallel parses
+            cases = self.__parse(doctest_output.split("\n"))
+        if errors:
+            cases = self.__insert_errors(cases, errors)
+        self.__intern_strings(cases)
+        self.testsuite = TestSuiteReport(name="doctests", cases=cases,
+                                         package=PACKAGE_NAME)
 
-    def as_xunit(self, filename):
+    def as_xunit(self, filename, max_failure_lines=0, compress=False):
         """
         Write out the test results in Xunit-style format
+
+        Args:
+          filename (str): The name of the output file
+          max_failure_lines (int): If greater than zero then failure
+                                   descriptions are cut to this many lines in
+                                   the XUnit file and each distinct description
+                                   is written in full to a file alongside
+          compress (bool): If True the files are gzip-compressed and '.gz'
+                           is appended to their names
+
+        Returns:
+          str: The name of the XUnit file that was written
         """
+        if compress and not filename.endswith(".gz"):
+            filename += ".gz"
+        failures_file = None
+        if max_failure_lines > 0:
+            if compress:
+                failures_file = filename[:-3] + FAILURES_SUFFIX + ".gz"
+            else:
+                failures_file = filename + FAILURES_SUFFIX
+        full_failures = {}
+
         suite_node = ElementTree.Element("testsuite")
         suite_node.attrib["name"] = self.testsuite.name
         suite_node.attrib["tests"] = str(self.testsuite.ntests)
         suite_node.attrib["failures"] = str(self.testsuite.nfailed)
+        suite_node.attrib["errors"] = str(self.testsuite.nerrors)
         if self.testsuite.package:
             suite_node.attrib["package"] = self.testsuite.package
 
@@ -226,26 +339,149 @@ class DocTestOutputParser(object):
             case_node = ElementTree.SubElement(suite_node, "testcase")
             case_node.attrib["classname"] = testcase.classname
             case_node.attrib["name"] = testcase.name
+            if testcase.time is not None:
+                case_node.attrib["time"] = "%.3f" % testcase.time
             if testcase.failed:
                 failure_node = ElementTree.SubElement(case_node, "failure")
                 failure_node.attrib["type"] = TEST_FAILURE_TYPE
-                failure_node.text = testcase.failure_descr
+                if failures_file:
+                    failure_node.text = self.__truncate_failure(testcase,
+                                                                max_failure_lines,
+                                                                failures_file,
+                                                                full_failures)
+                else:
+                    failure_node.text = testcase.failure_descr
+            if testcase.errored:
+                error_node = ElementTree.SubElement(case_node, "error")
+                error_node.attrib["type"] = testcase.error_type
+                error_node.attrib["message"] = testcase.error_descr
+                error_node.text = testcase.error_descr
         # Serialize to file
         tree = ElementTree.ElementTree(suite_node)
-        tree.write(filename, encoding="utf-8", xml_declaration=True)
+        with _open_output(filename, compress) as xunit:
+            tree.write(xunit, encoding="utf-8", xml_declaration=True)
+        if full_failures:
+            self.__write_full_failures(failures_file, compress, full_failures)
+        return filename
+
+    def set_times(self, timings):
+        """
+        Set the time taken by each test case from the times recorded for
+        each doctest group. The time of a group is shared equally between
+        the cases that it produced.
+
+        Args:
+          timings (dict): Maps (classname, group name) to the time in seconds
+        """
+        counts = {}
+        for case in self.testsuite.testcases:
+            key = (case.classname, case.name)
+            counts[key] = counts.get(key, 0) + 1
+        for case in self.testsuite.testcases:
+            key = (case.classname, case.name)
+            if key in timings:
+                case.time = timings[key] / counts[key]
+
+    def __insert_errors(self, cases, errors):
+        """
+        Returns the test cases with a case added for each error. An error
+        is placed after the last case of its group or, failing that, of
+        its document so the cases stay in document order. Errors of
+        documents without any cases go at the end.
+
+        Args:
+          cases (list): The parsed TestCaseReport objects
+          errors (list): A list of (classname, name, error type, description)
+        """
+        last = {}
+        for index, case in enumerate(cases):
+            last[case.classname] = index
+            last[(case.classname, case.name)] = index
+        placed = {}
+        for classname, name, error_type, error_descr in errors:
+            index = last.get((classname, name), last.get(classname))
+            placed.setdefault(index, []).append(
+                TestCaseReport(classname, name, None, error_type, error_descr))
+        merged = []
+        for index, case in enumerate(cases):
+            merged.append(case)
+            merged.extend(placed.get(index, []))
+        merged.extend(placed.get(None, []))
+        return merged
+
+    def __truncate_failure(self, testcase, max_lines, failures_file,
+                           full_failures):
+        """
+        Returns the failure description of the test case cut down to the
+        given number of lines. Bodies that are cut are recorded in
+        full_failures, keyed by body, along with an identifier that is
+        referenced from the cut text.
+
+        Args:
+          testcase (TestCaseReport): A failed test case
+          max_lines (int): The maximum number of lines of the body to keep
+          failures_file (str): The name of the file holding full descriptions
+          full_failures (dict): Maps each distinct body that has been cut
+                                to its identifier
+        """
+        lines = testcase.failure_body.split("\n")
+        if len(lines) <= max_lines:
+            return testcase.failure_descr
+        failure_id = full_failures.setdefault(testcase.failure_body,
+                                              len(full_failures) + 1)
+        kept = [testcase.failure_location] + lines[:max_lines]
+        kept.append("... %d more lines. See failure %d in %s"
+                    % (len(lines) - max_lines, failure_id,
+                       os.path.basename(failures_file)))
+        return "\n".join(kept)
+
+    def __write_full_failures(self, filename, compress, full_failures):
+        """
+        Write each distinct failure body that was cut from the XUnit file
+
+        Args:
+          filename (str): The name of the output file
+          compress (bool): If True the file is gzip-compressed
+          full_failures (dict): Maps each failure body to its identifier
+        """
+        ordered = sorted(full_failures.items(), key=lambda item: item[1])
+        with _open_output(filename, compress) as failures:
+            for body, failure_id in ordered:
+                text = "Failure %d\n%s\n%s\n\n" % (failure_id, FAILURE_MARKER,
+                                                   body)
+                if not isinstance(text, bytes):
+                    text = text.encode("utf-8")
+                failures.write(text)
+
+    def __intern_strings(self, cases):
+        """
+        Make test cases with equal classnames or failure bodies share a
+        single string object. When a shared setup fails many cases
+        have identical tracebacks so this saves a lot of memory.
+
+        Args:
+          cases (list): The list of TestCaseReport objects
+        """
+        strings = {}
+        for case in cases:
+            case.classname = strings.setdefault(case.classname, case.classname)
+            if case.failure_body:
+                case.failure_body = strings.setdefault(case.failure_body,
+                                                       case.failure_body)
 
     def __parse(self, results):
         """
-        Parse a doctest output file and a TestSuiteReport
-        object that describe the results of the
-        all tests on a single document
+        Parse a doctest output file and return the test cases
+        that describe the results of the tests in each document
 
         Arguments:
           results (iterable): Iterable where each element contains
                               a line of the results
 
         Returns:
-          TestSuite: TestSuite object
+          list: List of TestCaseReport objects. It is empty if the output
+                has no documents, e.g. when the only one was stopped by
+                a limit before it finished
         """
         in_doc = False
         document_txt = None
@@ -261,13 +497,33 @@ class DocTestOutputParser(object):
                 continue
             if line.startswith(DOCTEST_SUMMARY_TITLE): # end of tests
                 in_doc = False
-                cases.extend(self.__parse_document(document_txt))
+                if document_txt:
+                    cases.extend(self.__parse_document(document_txt))
                 document_txt = None
             if in_doc and line != "":
                 document_txt.append(line)
         # endfor
-        return TestSuiteReport(name="doctests", cases=cases,
-                               package=PACKAGE_NAME)
+        return cases
+
+    def __parse_parallel(self, filename, nprocs):
+        """
+        Parse a doctest output file by splitting it into chunks of whole
+        documents that are parsed in a pool of processes. The results are
+        identical to parsing the file serially
+
+        Arguments:
+          filename (str): The doctest output file
+          nprocs (int): The number of processes to use
+
+        Returns:
+          list: List of TestCaseReport objects
+        """
+        chunks = split_document_chunks(filename, nprocs * CHUNKS_PER_PROCESS)
+        results = parallel_map(_parse_document_chunk, chunks, nprocs)
+        cases = []
+        for chunk_cases in results:
+            cases.extend(TestCaseReport(*case) for case in chunk_cases)
+        return cases
 
     def __parse_document(self, results):
         """
@@ -419,7 +675,7 @@ class DocTestOutputParser(object):
         Args:
           fullname (str): Fullname of document (including paths)
         """
-        return PACKAGE_NAME + "." + fullname
+        return create_classname(fullname)
 
     def __create_failure_report(self, classname, failure_desc):
         """
@@ -444,6 +700,878 @@ class DocTestOutputParser(object):
 
 #-------------------------------------------------------------------------------
 
+class DocTestTimer(object):
+    """
+    Records the time taken to run each group of tests in each document
+    by wrapping the test_doc & test_group methods of a doctest builder
+    """
+
+    def __init__(self, builder):
+        """
+        Install the timer on the builder
+
+        Args:
+          builder: The Sphinx doctest builder
+        """
+        # Maps (classname, group name) to the time taken in seconds
+        self.timings = {}
+        self.classname = None
+        test_doc, test_group = builder.test_doc, builder.test_group
+
+        def timed_test_doc(docname, doctree):
+            self.classname = create_classname(docname)
+            return test_doc(docname, doctree)
+
+        def timed_test_group(group, filename):
+            start = time.time()
+            try:
+                return test_group(group, filename)
+            finally:
+                key = (self.classname, group.name)
+                self.timings[key] = self.timings.get(key, 0.0) + \
+                                    time.time() - start
+
+        builder.test_doc = timed_test_doc
+        builder.test_group = timed_test_group
+
+class DocTestScheduler(object):
+    """
+    Changes the order in which a doctest builder runs documents using the
+    results of the previous run. Documents that failed are run first,
+    then documents with no previous results and then the rest, longest
+    running first. Optionally stops running documents once a number of
+    failures has been reached.
+    """
+
+    def __init__(self, builder, previous, max_failures=0):
+        """
+        Install the scheduler on the builder
+
+        Args:
+          builder: The Sphinx doctest builder
+          previous (dict): Maps a classname to a (failed, time) tuple for
+                           the previous run, see read_previous_results
+          max_failures (int): If greater than zero, no further documents are
+                              run once this many failures have occurred
+        """
+        self.previous = previous
+        self.max_failures = max_failures
+        self.stopped = False
+        write, test_doc = builder.write, builder.test_doc
+
+        def scheduled_write(build_docnames, updated_docnames, method='update'):
+            if build_docnames is None:
+                build_docnames = builder.env.all_docs
+            return write(self.order(build_docnames), updated_docnames, method)
+
+        def limited_test_doc(docname, doctree):
+            if self.max_failures > 0:
+                nfailures = builder.total_failures + builder.setup_failures
+                if nfailures >= self.max_failures:
+                    if not self.stopped:
+                        builder.info("stopping after %d failures" % nfailures)
+                        self.stopped = True
+                    return
+            return test_doc(docname, doctree)
+
+        builder.write = scheduled_write
+        builder.test_doc = limited_test_doc
+
+    def order(self, docnames):
+        """
+        Returns the given document names in the order they should be run
+
+        Args:
+          docnames (iterable): The names of the documents to run
+        """
+        def priority(docname):
+            result = self.previous.get(create_classname(docname))
+            if result is None:
+                return (1, 0.0, docname)
+            failed, elapsed = result
+            if failed:
+                return (0, -elapsed, docname)
+            return (2, -elapsed, docname)
+        return sorted(docnames, key=priority)
+
+class ExampleTimeout(KeyboardInterrupt):
+    """
+    Raised within a forked document process when an example exceeds the
+    time limit. It derives from KeyboardInterrupt so that doctest does not
+    record it as an ordinary exception raised by the example.
+    """
+    pass
+
+class ForkedDocTestRunner(object):
+    """
+    Runs each document of a doctest builder in a child process forked from
+    the builder's process. The global setup code is run once in the parent,
+    so every child starts with the framework imported and any shared data
+    loaded, copy-on-write, while documents stay isolated from one another.
+    Each group starts from its own copy of the setup namespace, see
+    warm_namespace.
+
+    Up to nworkers children run at once. Their output is written to the
+    doctest output file in the order the documents were started.
+
+    The parent supervises the children and can limit the time and memory
+    used by each document and each example. An example or document that
+    exceeds a limit is recorded in the errors list rather than stalling
+    the build.
+    """
+
+    def __init__(self, builder, nworkers, timer=None, example_timeout=0,
+                 document_timeout=0, example_memory=0, document_memory=0):
+        """
+        Run the global setup code and install the runner on the builder
+
+        Args:
+          builder: The Sphinx doctest builder
+          nworkers (int): The maximum number of children running at once
+          timer (DocTestTimer): If given, the timings recorded in the
+                                children are merged into it
+          example_timeout (float): Seconds allowed for each example. 0 is
+                                   unlimited
+          document_timeout (float): Seconds allowed for each document. 0 is
+                                    unlimited
+          example_memory (int): Megabytes of extra memory allowed for each
+                                example. 0 is unlimited
+          document_memory (int): Megabytes of memory allowed for each
+                                 document's process. 0 is unlimited
+        """
+        self.builder = builder
+        self.nworkers = nworkers
+        self.timer = timer
+        self.example_timeout = example_timeout
+        self.document_timeout = document_timeout
+        self.example_memory = example_memory * 1024 * 1024
+        self.document_memory = document_memory * 1024 * 1024
+        # (docname, pid, read end of pipe, start time) for each running child
+        self.running = []
+        # (classname, name, error type, description) for each limit exceeded
+        self.errors = []
+
+        self._warm_up(builder)
+        test_doc, finish = builder.test_doc, builder.finish
+
+        def forked_test_doc(docname, doctree):
+            while len(self.running) >= self.nworkers:
+                self._collect(self.running.pop(0))
+            self.running.append(self._start(test_doc, docname, doctree))
+
+        def forked_finish():
+            while self.running:
+                self._collect(self.running.pop(0))
+            result = finish()
+            if self.errors:
+                # a limit exceeded fails the build like a failed test
+                builder.app.statuscode = 1
+            return result
+
+        builder.test_doc = forked_test_doc
+        builder.finish = forked_finish
+
+    def _warm_up(self, builder):
+        """
+        Run the global setup code once and make the setup of each group
+        start from a copy of its namespace rather than running the code
+        again. Each group gets its own copy, as it would get its own run
+        of the code, so changes made by one group are not seen by others.
+
+        If the code fails it is left to run in each group, where the
+        failure is reported as a setup failure as it is without forking.
+        """
+        config = builder.config
+        setup_code = config.doctest_global_setup
+        if not setup_code:
+            return
+        WARM_GLOBALS.clear()
+        try:
+            exec(compile(setup_code, "<doctest_global_setup>", "exec"),
+                 WARM_GLOBALS)
+        except Exception as exc:
+            WARM_GLOBALS.clear()
+            builder.warn("doctest_global_setup failed, it is run in each "
+                         "group instead: %s: %s" % (type(exc).__name__, exc))
+            return
+        WARM_GLOBALS.pop("__builtins__", None)
+        config.doctest_global_setup = \
+            "import sys as _sys\n" \
+            "globals().update(_sys.modules[%r].warm_namespace())\n" \
+            "del _sys" % __name__
+
+    def _start(self, test_doc, docname, doctree):
+        """
+        Fork a child process that runs the tests of a single document
+
+        Returns:
+          tuple: (docname, pid, read end of the result pipe, start time)
+        """
+        read_end, write_end = os.pipe()
+        pid = os.fork()
+        if pid != 0:
+            os.close(write_end)
+            return (docname, pid, read_end, time.time())
+
+        # child
+        os.close(read_end)
+        status = 0
+        try:
+            pipe = os.fdopen(write_end, "wb")
+            result = self._run_child(test_doc, docname, doctree, pipe)
+            _send_message(pipe, ("result", result))
+            pipe.close()
+        except BaseException:
+            status = 1
+        finally:
+            os._exit(status)
+
+    def _run_child(self, test_doc, docname, doctree, pipe):
+        """
+        Run the tests of a document within the child process and return
+        what the parent needs to account for them. The name of each group
+        is sent to the parent as it starts, along with any example that
+        exceeds a limit.
+
+        Returns:
+          dict: The output text, the change in each builder counter and
+                the timings of the document's groups
+        """
+        builder = self.builder
+        output = []
+        class Capture(object):
+            def write(self, text):
+                output.append(text)
+        builder.outfile = Capture()
+        builder.info = lambda *args, **kwargs: None
+        self._apply_limits(builder, pipe)
+
+        before = [getattr(builder, name) for name in BUILDER_COUNTERS]
+        test_doc(docname, doctree)
+        after = [getattr(builder, name) for name in BUILDER_COUNTERS]
+        timings = {}
+        if self.timer is not None:
+            classname = create_classname(docname)
+            for key, elapsed in self.timer.timings.items():
+                if key[0] == classname:
+                    timings[key] = elapsed
+        return {"output": u"".join(output),
+                "counters": [end - start for start, end in zip(before, after)],
+                "timings": timings}
+
+    def _apply_limits(self, builder, pipe):
+        """
+        Set up the time and memory limits within the child process. The
+        example limits are armed as each example of the test runner starts
+        and disarmed when it is reported, so they do not cover the setup and
+        cleanup code or the rest of the group. An example that runs out of
+        time stops the rest of its group, which keeps the output of the
+        document complete.
+
+        Examples that doctest does not report, i.e. those after a failure
+        when the REPORT_ONLY_FIRST_FAILURE option is set, are not limited.
+        """
+        import resource
+        import signal
+        from sphinx.ext.doctest import SphinxDocTestRunner
+
+        if self.document_memory > 0:
+            _, hard = resource.getrlimit(resource.RLIMIT_AS)
+            resource.setrlimit(resource.RLIMIT_AS, (self.document_memory, hard))
+        memory_limit = resource.getrlimit(resource.RLIMIT_AS)
+
+        # the group, and the test being run by the test runner along with
+        # the examples of it that have completed & failed so far
+        current = {"group": None, "test": None, "tries": 0, "failures": 0}
+        example_timeout = self.example_timeout
+        example_memory = self.example_memory
+        document_memory = self.document_memory
+        test_group = builder.test_group
+        report_start = SphinxDocTestRunner.report_start
+        report_success = SphinxDocTestRunner.report_success
+        report_failure = SphinxDocTestRunner.report_failure
+        report_unexpected_exception = \
+            SphinxDocTestRunner.report_unexpected_exception
+
+        def end_example():
+            if example_timeout > 0:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+            if example_memory > 0:
+                resource.setrlimit(resource.RLIMIT_AS, memory_limit)
+
+        def limited_test_group(group, filename):
+            current["group"] = group.name
+            _send_message(pipe, ("group", group.name))
+            try:
+                return test_group(group, filename)
+            except ExampleTimeout:
+                end_example()
+                # doctest records the outcome of a test once all of its
+                # examples have run. Record those that completed so they
+                # are reported along with the rest of the group
+                test = current["test"]
+                if test is not None and current["tries"] > 0:
+                    builder.test_runner._DocTestRunner__record_outcome(
+                        test, current["failures"], current["tries"])
+                _send_message(pipe, ("error", group.name, "Timeout",
+                                     "An example in group '%s' exceeded the "
+                                     "time limit of %gs"
+                                     % (group.name, example_timeout)))
+
+        def on_alarm(signum, frame):
+            raise ExampleTimeout()
+
+        def limited_report_start(runner, out, test, example):
+            result = report_start(runner, out, test, example)
+            if runner is builder.test_runner:
+                if test is not current["test"]:
+                    current.update(test=test, tries=0, failures=0)
+                if example_memory > 0:
+                    _limit_extra_memory(example_memory, document_memory)
+                if example_timeout > 0:
+                    signal.signal(signal.SIGALRM, on_alarm)
+                    signal.setitimer(signal.ITIMER_REAL, example_timeout)
+            return result
+
+        def ending_example(report, failed):
+            def limited_report(runner, *args):
+                if runner is builder.test_runner:
+                    end_example()
+                    current["tries"] += 1
+                    current["failures"] += failed
+                return report(runner, *args)
+            return limited_report
+
+        def report_memory_error(runner, out, test, example, exc_info):
+            if issubclass(exc_info[0], MemoryError):
+                lineno = None
+                if test.lineno is not None and example.lineno is not None:
+                    lineno = test.lineno + example.lineno + 1
+                _send_message(pipe, ("error", current["group"], "MemoryLimit",
+                                     "An example in group '%s' exceeded the "
+                                     "memory limit at line %s"
+                                     % (current["group"], lineno)))
+            return report_unexpected_exception(runner, out, test, example,
+                                               exc_info)
+
+        # This only changes the class within the child process
+        builder.test_group = limited_test_group
+        SphinxDocTestRunner.report_start = limited_report_start
+        SphinxDocTestRunner.report_success = ending_example(report_success, 0)
+        SphinxDocTestRunner.report_failure = ending_example(report_failure, 1)
+        SphinxDocTestRunner.report_unexpected_exception = \
+            ending_example(report_memory_error, 1)
+
+    def _collect(self, child):
+        """
+        Wait for a child to finish and add its results to the builder. A
+        child that exceeds the document time limit is killed.
+        """
+        import select
+        import signal
+
+        docname, pid, read_end, started = child
+        data, timed_out = [], False
+        while True:
+            timeout = None
+            if self.document_timeout > 0:
+                timeout = max(0, started + self.document_timeout - time.time())
+            ready, _, _ = select.select([read_end], [], [], timeout)
+            if not ready:
+                os.kill(pid, signal.SIGKILL)
+                timed_out = True
+                break
+            chunk = os.read(read_end, 65536)
+            if not chunk:
+                break
+            data.append(chunk)
+        os.close(read_end)
+        _, status = os.waitpid(pid, 0)
+
+        classname = create_classname(docname)
+        group, result = None, None
+        for message in _read_messages(b"".join(data)):
+            if message[0] == "group":
+                group = message[1]
+            elif message[0] == "error":
+                self.errors.append((classname,) + message[1:])
+            elif message[0] == "result":
+                result = message[1]
+        if timed_out:
+            self.errors.append((classname, group or docname, "Timeout",
+                                "Document '%s' exceeded the time limit of %gs "
+                                "while running group '%s'"
+                                % (docname, self.document_timeout, group)))
+            self.builder.warn("doctest process for '%s' killed after %gs"
+                              % (docname, self.document_timeout))
+            return
+        if result is None or status != 0:
+            self.errors.append((classname, group or docname, "Crash",
+                                "The process running document '%s' ended with "
+                                "status %d while running group '%s'"
+                                % (docname, status, group)))
+            self.builder.warn("doctest process for '%s' failed with status %d"
+                              % (docname, status))
+            return
+        self.builder._out(result["output"])
+        for name, delta in zip(BUILDER_COUNTERS, result["counters"]):
+            setattr(self.builder, name, getattr(self.builder, name) + delta)
+        if self.timer is not None:
+            self.timer.timings.update(result["timings"])
+
+def _send_message(pipe, message):
+    """
+    Send a length-prefixed pickled message from a child to its parent
+    """
+    data = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+    pipe.write(struct.pack("!I", len(data)) + data)
+    pipe.flush()
+
+def _read_messages(data):
+    """
+    Returns the list of complete messages in the data sent by a child
+    """
+    messages, offset = [], 0
+    while offset + 4 <= len(data):
+        size = struct.unpack("!I", data[offset:offset + 4])[0]
+        if offset + 4 + size > len(data):
+            break
+        messages.append(pickle.loads(data[offset + 4:offset + 4 + size]))
+        offset += 4 + size
+    return messages
+
+def _limit_extra_memory(extra, ceiling):
+    """
+    Limit the address space of this process to its current size plus the
+    given number of bytes, capped by the ceiling if that is non-zero.
+    The current size is read from /proc so this is a no-op elsewhere.
+    """
+    import resource
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[0])
+    except (IOError, OSError, ValueError):
+        return
+    limit = pages * resource.getpagesize() + extra
+    if ceiling > 0:
+        limit = min(limit, ceiling)
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+def warm_namespace():
+    """
+    Returns a copy of the namespace of the global setup code for a single
+    doctest group. Values are deep-copied so that a group changing e.g. a
+    list from the setup code does not change it for later groups. Modules
+    are shared, as are values that cannot be copied, e.g. those holding
+    open files, which a group must therefore leave unchanged.
+    """
+    memo = dict((id(module), module) for module in list(sys.modules.values())
+                if module is not None)
+    namespace = {}
+    for name, value in WARM_GLOBALS.items():
+        try:
+            namespace[name] = copy.deepcopy(value, memo)
+        except Exception:
+            namespace[name] = value
+    return namespace
+
+def read_previous_results(outdir):
+    """
+    Read the results of each document from the XUnit file of the previous
+    run in the given directory, if there is one.
+
+    Args:
+      outdir (str): The output directory of the doctest builder
+
+    Returns:
+      dict: Maps a classname to a (failed, time) tuple where failed is True
+            if any case in the document failed or had an error and time is
+            the total time
+            of its cases
+    """
+    candidates = [os.path.join(outdir, XUNIT_OUTPUT),
+                  os.path.join(outdir, XUNIT_OUTPUT + ".gz")]
+    candidates = [name for name in candidates if os.path.exists(name)]
+    if not candidates:
+        return {}
+    filename = max(candidates, key=os.path.getmtime)
+
+    results = {}
+    with _open_input(filename) as xunit:
+        for _, elem in ElementTree.iterparse(xunit):
+            if elem.tag != "testcase":
+                continue
+            classname = elem.get("classname")
+            failed, elapsed = results.get(classname, (False, 0.0))
+            failed = failed or (elem.find("failure") is not None) or \
+                     (elem.find("error") is not None)
+            elapsed += float(elem.get("time", 0.0))
+            results[classname] = (failed, elapsed)
+            elem.clear()
+    return results
+
+def create_classname(fullname):
+    """
+    Given a fullname, that can include path separators,
+    produce a classname for the document
+
+    Args:
+      fullname (str): Fullname of document (including paths)
+    """
+    return PACKAGE_NAME + "." + fullname
+
+#-------------------------------------------------------------------------------
+
+def merge_xunit(inputs, output, compress=False):
+    """
+    Merge several XUnit files into one. The files are streamed so that
+    only the identifiers of the test cases are held in memory. A test case
+    whose classname and name were already given by an earlier file is
+    dropped, while repeated names within a single file are kept as doctest
+    groups can hold several tests.
+
+    Args:
+      inputs (list): The XUnit files to merge. Files ending in '.gz' are
+                     read as gzip-compressed
+      output (str): The name of the merged file
+      compress (bool): If True the merged file is gzip-compressed
+
+    Returns:
+      tuple: The number of (tests, failures, errors) in the merged file
+    """
+    import shutil
+    import tempfile
+
+    seen = set()
+    ntests, nfailures, nerrors = 0, 0, 0
+    package = None
+    outdir = os.path.dirname(os.path.abspath(output))
+    with tempfile.TemporaryFile(dir=outdir) as cases:
+        for filename in inputs:
+            current = set()
+            with _open_input(filename) as xunit:
+                root = None
+                for event, elem in ElementTree.iterparse(xunit,
+                                                         events=("start", "end")):
+                    if event == "start":
+                        if root is None:
+                            root = elem
+                            if package is None:
+                                package = root.get("package")
+                        continue
+                    if elem.tag != "testcase":
+                        continue
+                    key = (elem.get("classname"), elem.get("name"))
+                    if key not in seen:
+                        current.add(key)
+                        ntests += 1
+                        if elem.find("failure") is not None:
+                            nfailures += 1
+                        if elem.find("error") is not None:
+                            nerrors += 1
+                        elem.tail = None
+                        cases.write(ElementTree.tostring(elem, encoding="utf-8"))
+                    # drop the parsed cases to keep memory flat
+                    root.clear()
+            seen.update(current)
+
+        cases.seek(0)
+        with _open_output(output, compress) as merged:
+            suite_node = ElementTree.Element("testsuite")
+            suite_node.attrib["name"] = "doctests"
+            suite_node.attrib["tests"] = str(ntests)
+            suite_node.attrib["failures"] = str(nfailures)
+            suite_node.attrib["errors"] = str(nerrors)
+            if package:
+                suite_node.attrib["package"] = package
+            # Write the opening tag of the suite followed by the cases
+            head = ElementTree.tostring(suite_node, encoding="utf-8")
+            head = head[:head.rindex(b"/>")].rstrip() + b">"
+            merged.write(b"<?xml version='1.0' encoding='utf-8'?>\n")
+            merged.write(head)
+            shutil.copyfileobj(cases, merged)
+            merged.write(b"</testsuite>")
+    return ntests, nfailures, nerrors
+
+def _convert_output(job):
+    """
+    Convert a single doctest output file to an XUnit file alongside it.
+    This is used by the worker processes of the 'convert' command.
+
+    Args:
+      job (tuple): (filename, max_failure_lines, compress, nprocs)
+
+    Returns:
+      str: The name of the XUnit file that was written
+    """
+    filename, max_failure_lines, compress, nprocs = job
+    xunit_file = os.path.join(os.path.dirname(filename), XUNIT_OUTPUT)
+    doctests = DocTestOutputParser(filename, nprocs=nprocs)
+    return doctests.as_xunit(xunit_file, max_failure_lines=max_failure_lines,
+                             compress=compress)
+
+def main(argv=None):
+    """
+    Entry point for running the module from the command line
+
+    Args:
+      argv (list): The command line arguments. Defaults to sys.argv[1:]
+
+    Returns:
+      int: The exit code
+    """
+    import argparse
+    import sys
+
+    cmdline = argparse.ArgumentParser(prog="python -m mantiddoc.doctest",
+                                      description="Convert doctest output "
+                                      "to XUnit format and merge XUnit files")
+    commands = cmdline.add_subparsers(dest="command")
+    convert = commands.add_parser("convert", help="Convert doctest output "
+                                  "files to %s files alongside them"
+                                  % XUNIT_OUTPUT)
+    convert.add_argument("outputs", nargs="+", metavar="OUTPUT",
+                         help="doctest output files")
+    convert.add_argument("-j", "--jobs", type=int, default=1,
+                         help="number of processes to use")
+    convert.add_argument("--max-failure-lines", type=int, default=0,
+                         help="maximum lines of each failure to keep")
+    convert.add_argument("--compress", action="store_true",
+                         help="gzip-compress the XUnit files")
+    merge = commands.add_parser("merge", help="Merge XUnit files into one, "
+                                "dropping cases repeated in later files")
+    merge.add_argument("inputs", nargs="+", metavar="XUNIT",
+                       help="XUnit files to merge")
+    merge.add_argument("-o", "--output", required=True,
+                       help="name of the merged file")
+    merge.add_argument("--compress", action="store_true",
+                       help="gzip-compress the merged file")
+    args = cmdline.parse_args(argv)
+
+    if args.command == "convert":
+        if len(args.outputs) == 1:
+            # parallelize within the single file instead
+            jobs = [(args.outputs[0], args.max_failure_lines, args.compress,
+                     args.jobs)]
+            written = [_convert_output(jobs[0])]
+        else:
+            jobs = [(filename, args.max_failure_lines, args.compress, 1)
+                    for filename in args.outputs]
+            # a single job runs in this process
+            nworkers = args.jobs if args.jobs > 1 else 0
+            written = parallel_map(_convert_output, jobs, nworkers,
+                                   chunksize=1)
+        for filename in written:
+            sys.stdout.write("Wrote %s\n" % filename)
+    elif args.command == "merge":
+        ntests, nfailures, nerrors = merge_xunit(args.inputs, args.output,
+                                                 args.compress)
+        sys.stdout.write("Wrote %d tests (%d failures, %d errors) to %s\n"
+                         % (ntests, nfailures, nerrors, args.output))
+    else:
+        cmdline.print_usage()
+        return 2
+    return 0
+
+#-------------------------------------------------------------------------------
+
+def _open_input(filename):
+    """
+    Open a file for binary reading, gzip-compressed if it ends in '.gz'
+    """
+    if filename.endswith(".gz"):
+        return gzip.open(filename, "rb")
+    else:
+        return open(filename, "rb")
+
+def _open_output(filename, compress):
+    """
+    Open a file for binary writing, optionally gzip-compressed
+    """
+    if compress:
+        return gzip.open(filename, "wb")
+    else:
+        return open(filename, "wb")
+
+def split_document_chunks(filename, nchunks):
+    """
+    Find the byte ranges that split a doctest output file into roughly
+    equal chunks. Each chunk starts at the beginning of a line starting
+    with 'Document:' so chunks can be parsed independently. The file is
+    memory-mapped rather than read.
+
+    Args:
+      filename (str): The doctest output file
+      nchunks (int): The number of chunks wanted
+
+    Returns:
+      list: A list of (filename, start, end, is_last) tuples
+    """
+    size = os.path.getsize(filename)
+    if size == 0:
+        return []
+    marker = ("\n" + DOCTEST_DOCUMENT_BEGIN).encode("utf-8")
+    target_size = max(1, size // max(1, nchunks))
+    with open(filename, "rb") as results:
+        mapped = mmap.mmap(results.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if mapped[:len(marker) - 1] == marker[1:]:
+                start = 0
+            else:
+                start = mapped.find(marker)
+                if start < 0:
+                    return []
+                start += 1
+            chunks = []
+            while start < size:
+                end = mapped.find(marker, min(size, start + target_size))
+                if end < 0:
+                    end = size
+                else:
+                    end += 1
+                chunks.append((filename, start, end, end == size))
+                start = end
+        finally:
+            mapped.close()
+    return chunks
+
+def _cpu_count():
+    """
+    Returns the number of CPUs of the host or 1 if it cannot be found
+    """
+    import multiprocessing
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+def _parse_document_chunk(chunk):
+    """
+    Parse the documents within a byte range of a doctest output file. This
+    is used by the worker processes of the parallel parse.
+
+    Args:
+      chunk (tuple): (filename, start, end, is_last) from split_document_chunks
+
+    Returns:
+      list: A (classname, name, failure_descr) tuple for each test case in
+            the range. Tuples are much cheaper to send between processes
+    """
+    filename, start, end, is_last = chunk
+    with open(filename, "rb") as results:
+        mapped = mmap.mmap(results.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            text = mapped[start:end]
+        finally:
+            mapped.close()
+    if not isinstance(text, str):
+        text = text.decode("utf-8")
+    # Only the final chunk contains the summary that ends the last document
+    if not is_last:
+        text += "\n" + DOCTEST_SUMMARY_TITLE
+    cases = DocTestOutputParser(text, isfile=False).testsuite.testcases
+    return [(case.classname, case.name, case.failure_descr or None)
+            for case in cases]
+
+#-------------------------------------------------------------------------------
+
+def install_doctest_timer(app):
+    """
+    Callback for the 'builder-inited' Sphinx event. If the builder is
+    'doctest' then the time taken by each group of tests is recorded.
+
+    Arguments:
+      app (Sphinx.application): Sphinx application object
+    """
+    if app.builder.name == "doctest":
+        app.doctest_timer = DocTestTimer(app.builder)
+
+def install_forked_runner(app):
+    """
+    Callback for the 'builder-inited' Sphinx event. If the builder is
+    'doctest' and doctest_fork_workers is set then each document is run
+    in a child process forked from a process that has already run the
+    global setup code. Setting any time or memory limit also runs
+    documents this way, as the limits are enforced on the children.
+
+    Arguments:
+      app (Sphinx.application): Sphinx application object
+    """
+    if app.builder.name != "doctest":
+        return
+    config = app.config
+    limits = (config.doctest_example_timeout, config.doctest_document_timeout,
+              config.doctest_example_memory_limit,
+              config.doctest_document_memory_limit)
+    nworkers = config.doctest_fork_workers
+    if nworkers < 1 and any(limit > 0 for limit in limits):
+        nworkers = 1
+    if nworkers < 1:
+        return
+    if not hasattr(os, "fork"):
+        app.warn("Forked doctest processes and limits require os.fork. "
+                 "Running documents in the main process")
+        return
+    app.doctest_runner = ForkedDocTestRunner(app.builder, nworkers,
+                                             getattr(app, "doctest_timer", None),
+                                             *limits)
+
+def install_doctest_scheduler(app):
+    """
+    Callback for the 'builder-inited' Sphinx event. If the builder is
+    'doctest' and the schedule is 'history' then the documents are
+    ordered by the results of the previous run. A failure limit is
+    applied with any schedule.
+
+    Arguments:
+      app (Sphinx.application): Sphinx application object
+    """
+    if app.builder.name != "doctest":
+        return
+    schedule = app.config.doctest_schedule
+    if schedule == "history":
+        previous = read_previous_results(app.builder.outdir)
+        app.debug("Scheduling doctests from %d previous results"
+                  % len(previous))
+    elif schedule == "alphabetical":
+        previous = {}
+    else:
+        raise ValueError("Unknown doctest_schedule '%s'. Expected "
+                         "'alphabetical' or 'history'" % schedule)
+    app.doctest_scheduler = DocTestScheduler(app.builder, previous,
+                                             app.config.doctest_max_failures)
+
+def record_history(app, testsuite):
+    """
+    Add the results of this run to the history database in the output
+    directory and report the tests that have slowed down or that
+    flip between passing and failing.
+
+    Arguments:
+      app (Sphinx.application): Sphinx application object
+      testsuite (TestSuiteReport): The results of this run
+    """
+    from history import DocTestHistory
+
+    history_file = os.path.join(app.builder.outdir, HISTORY_FILE)
+    app.debug("Adding doctest results to history '%s'" % history_file)
+    history = DocTestHistory(history_file)
+    try:
+        history.add_run(testsuite.testcases)
+        history.prune(app.config.doctest_history_keep_runs)
+        window = app.config.doctest_history_window
+        slow = history.slow_tests(app.config.doctest_history_slow_factor,
+                                  window)
+        for classname, name, average, latest in slow:
+            app.info("Slow test: %s %s took %.2fs, average %.2fs"
+                     % (classname, name, latest, average))
+        for classname, name, flips in history.flaky_tests(window):
+            app.info("Flaky test: %s %s changed outcome %d times in the "
+                     "last %d runs" % (classname, name, flips, window))
+    finally:
+        history.close()
+
 def doctest_to_xunit(app, exception):
     """
     If the runner was 'doctest'then parse the "output.txt"
@@ -457,20 +1585,87 @@ def doctest_to_xunit(app, exception):
     if app.builder.name != "doctest":
         app.debug("Skipping xunit parsing for builder '%s'" % app.builder.name)
         return
-    import os
 
+    # If the build stopped part way the builder has not written the summary
+    # that ends the output. Finish it so the documents completed so far,
+    # including any still running in child processes, are converted
+    outfile = getattr(app.builder, "outfile", None)
+    if outfile is not None and not getattr(outfile, "closed", True):
+        app.builder.finish()
     doctest_file = os.path.join(app.builder.outdir, DOCTEST_OUTPUT)
+    if not os.path.exists(doctest_file):
+        app.warn("No doctest output file '%s' to convert" % doctest_file)
+        return
     app.debug("Parsing doctest output file '%s'" % doctest_file)
-    doctests = DocTestOutputParser(doctest_file)
+    runner = getattr(app, "doctest_runner", None)
+    try:
+        doctests = DocTestOutputParser(doctest_file,
+                                       nprocs=app.config.doctest_xunit_parse_processes,
+                                       errors=runner.errors if runner else None)
+    except ValueError as exc:
+        app.warn("Cannot convert doctest output file '%s': %s"
+                 % (doctest_file, exc))
+        return
+    timer = getattr(app, "doctest_timer", None)
+    if timer is not None:
+        doctests.set_times(timer.timings)
     app.debug("Saving doctest as xunit to file '%s'" % doctest_file)
     xunit_file = os.path.join(app.builder.outdir, XUNIT_OUTPUT)
 
-    doctests.as_xunit(xunit_file)
+    doctests.as_xunit(xunit_file,
+                      max_failure_lines=app.config.doctest_xunit_max_failure_lines,
+                      compress=app.config.doctest_xunit_compress)
+    if app.config.doctest_history:
+        record_history(app, doctests.testsuite)
 
 #-------------------------------------------------------------------------------
 
 def setup(app):
     """
-    Connect the 'build-finished' event to the handler function.
+    Connect the 'builder-inited' & 'build-finished' events to the handler
+    functions.
     """
+    # number of processes used to parse the doctest output. Values
+    # greater than 1 parse chunks of documents in parallel, using at most
+    # one process per CPU
+    app.add_config_value('doctest_xunit_parse_processes', 1, False)
+    # maximum number of lines of each failure description kept in the
+    # XUnit file. 0 keeps everything
+    app.add_config_value('doctest_xunit_max_failure_lines', 0, False)
+    # if True the XUnit output is gzip-compressed
+    app.add_config_value('doctest_xunit_compress', False, False)
+    # if True the results of each run are added to a history database
+    # that is used to report slow and flaky tests
+    app.add_config_value('doctest_history', False, False)
+    # the number of runs kept in the history database. 0 keeps every run
+    app.add_config_value('doctest_history_keep_runs', 100, False)
+    # the number of previous runs used to spot slow or flaky tests
+    app.add_config_value('doctest_history_window', 10, False)
+    # tests are reported as slow if their latest time exceeds their
+    # average time by this factor
+    app.add_config_value('doctest_history_slow_factor', 2.0, False)
+    # the order documents are tested in. 'alphabetical' or 'history', which
+    # runs previously failing documents and then the slowest ones first
+    app.add_config_value('doctest_schedule', 'alphabetical', False)
+    # stop running documents after this many failures. 0 runs everything
+    app.add_config_value('doctest_max_failures', 0, False)
+    # if greater than zero then each document is run in a child process
+    # forked after the global setup code has run, with up to this many
+    # running at once
+    app.add_config_value('doctest_fork_workers', 0, False)
+    # limits on the wall-clock seconds & megabytes of memory for each
+    # example and each document. 0 is unlimited. Setup & cleanup code only
+    # counts towards the document limits. An example or document over a
+    # limit is reported as an error in the XUnit output and fails the build
+    app.add_config_value('doctest_example_timeout', 0, False)
+    app.add_config_value('doctest_document_timeout', 0, False)
+    app.add_config_value('doctest_example_memory_limit', 0, False)
+    app.add_config_value('doctest_document_memory_limit', 0, False)
+    app.connect('builder-inited', install_doctest_timer)
+    app.connect('builder-inited', install_forked_runner)
+    app.connect('builder-inited', install_doctest_scheduler)
     app.connect('build-finished', doctest_to_xunit)
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
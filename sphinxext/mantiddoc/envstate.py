@@ -0,0 +1,76 @@
+"""
+    Reports the size of the state that the mantiddoc extensions keep in the
+    pickled environment, and how long it takes to load, after the
+    environment has been updated. Enable it by adding 'mantiddoc.envstate'
+    to the extensions in conf.py.
+"""
+import os
+import time
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from sphinx.application import ENV_PICKLE_FILENAME
+
+# Attributes of the environment set by the mantiddoc extensions
+ENV_ATTRIBUTES = ("categories", "algorithm_fingerprints")
+# Names of the domains registered by the mantiddoc extensions
+DOMAINS = ("algm",)
+
+def measure_env_state(env):
+    """
+    Pickles each piece of mantiddoc state held by the environment as it
+    would be pickled with the environment and times loading it again
+
+    Args:
+      env: The build environment
+
+    Returns:
+      list: A list of (name, size in bytes, load time in seconds)
+    """
+    parts = []
+    for attr in ENV_ATTRIBUTES:
+        if hasattr(env, attr):
+            parts.append(("env." + attr, getattr(env, attr)))
+    for domain in DOMAINS:
+        if domain in env.domaindata:
+            parts.append(("%s domain" % domain, env.domaindata[domain]))
+
+    results = []
+    for name, value in parts:
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        start = time.time()
+        pickle.loads(data)
+        results.append((name, len(data), time.time() - start))
+    return results
+
+def report_env_state(app, env):
+    """
+    Callback for the 'env-updated' Sphinx event. Logs the size and load
+    time of each piece of mantiddoc state and of their total, along with
+    the size of the environment pickled by the previous build.
+
+    Arguments:
+      app: A Sphinx application object
+      env: The build environment
+    """
+    results = measure_env_state(env)
+    if not results:
+        return
+    total_size = sum(size for _, size, _ in results)
+    total_time = sum(elapsed for _, _, elapsed in results)
+    envfile = os.path.join(app.doctreedir, ENV_PICKLE_FILENAME)
+    whole = ""
+    if os.path.exists(envfile):
+        whole = " (last pickled environment: %.1f KiB)" \
+            % (os.path.getsize(envfile) / 1024.)
+    app.info("mantiddoc environment state: %.1f KiB, loads in %.1f ms%s"
+             % (total_size / 1024., total_time * 1000, whole))
+    for name, size, elapsed in results:
+        app.info("    %s: %.1f KiB, loads in %.1f ms"
+                 % (name, size / 1024., elapsed * 1000))
+
+#------------------------------------------------------------------------------
+def setup(app):
+    app.connect("env-updated", report_env_state)
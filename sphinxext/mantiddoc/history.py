@@ -0,0 +1,197 @@
+"""
+    Keeps a history of doctest results in an SQLite database so that
+    tests that have become slower or that flip between passing and
+    failing can be reported.
+
+    Each run stores one row per test case, identified by its classname and
+    name, holding whether it passed and how long it took. Cases that share
+    a classname and name within a run, i.e. several tests in one doctest
+    group, are combined into a single row.
+"""
+import sqlite3
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cases (
+    id INTEGER PRIMARY KEY,
+    classname TEXT NOT NULL,
+    name TEXT NOT NULL,
+    UNIQUE (classname, name)
+);
+CREATE TABLE IF NOT EXISTS results (
+    case_id INTEGER NOT NULL,
+    run_id INTEGER NOT NULL,
+    passed INTEGER NOT NULL,
+    time REAL,
+    PRIMARY KEY (case_id, run_id)
+);
+CREATE INDEX IF NOT EXISTS results_run ON results (run_id);
+"""
+
+class DocTestHistory(object):
+    """
+    Stores and queries the outcomes and timings of successive doctest runs
+    """
+
+    def __init__(self, filename):
+        """
+        Open, or create, the history database
+
+        Args:
+          filename (str): The name of the SQLite database file
+        """
+        self.connection = sqlite3.connect(filename)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def add_run(self, testcases, started=None):
+        """
+        Record the results of a run
+
+        Args:
+          testcases (list): A list of TestCaseReport objects
+          started (float): The time the run started. Defaults to now
+
+        Returns:
+          int: The identifier of the new run
+        """
+        # Combine cases that share a classname & name
+        results = {}
+        for case in testcases:
+            key = (case.classname, case.name)
+            passed, elapsed = results.get(key, (True, None))
+            passed = passed and case.passed
+            if case.time is not None:
+                elapsed = (elapsed or 0.0) + case.time
+            results[key] = (passed, elapsed)
+
+        with self.connection:
+            cursor = self.connection.execute("INSERT INTO runs (started) VALUES (?)",
+                                             (started or time.time(),))
+            run_id = cursor.lastrowid
+            self.connection.executemany("INSERT OR IGNORE INTO cases "
+                                        "(classname, name) VALUES (?, ?)",
+                                        results.keys())
+            case_ids = {}
+            for case_id, classname, name in \
+                    self.connection.execute("SELECT id, classname, name FROM cases"):
+                case_ids[(classname, name)] = case_id
+            rows = [(case_ids[key], run_id, int(passed), elapsed)
+                    for key, (passed, elapsed) in results.items()]
+            self.connection.executemany("INSERT INTO results "
+                                        "(case_id, run_id, passed, time) "
+                                        "VALUES (?, ?, ?, ?)", rows)
+        return run_id
+
+    def slow_tests(self, factor=2.0, window=10, min_time=0.1):
+        """
+        Find tests whose time in the latest run exceeds their average time
+        over the preceding runs by the given factor
+
+        Args:
+          factor (float): Ratio of latest to average time to report
+          window (int): The number of preceding runs to average over
+          min_time (float): Ignore tests quicker than this in the latest run
+
+        Returns:
+          list: A list of (classname, name, average time, latest time),
+                slowest regression first
+        """
+        runs = self._latest_runs(window + 1)
+        if len(runs) < 2:
+            return []
+        latest, first = runs[0], runs[-1]
+        query = """
+        SELECT c.classname, c.name, AVG(prev.time), latest.time
+        FROM results AS latest
+        JOIN cases AS c ON c.id = latest.case_id
+        JOIN results AS prev ON prev.case_id = latest.case_id
+             AND prev.run_id >= ? AND prev.run_id < ?
+        WHERE latest.run_id = ? AND latest.time >= ? AND prev.time IS NOT NULL
+        GROUP BY latest.case_id
+        HAVING latest.time > ? * AVG(prev.time)
+        ORDER BY latest.time / AVG(prev.time) DESC
+        """
+        return self.connection.execute(query, (first, latest, latest,
+                                               min_time, factor)).fetchall()
+
+    def flaky_tests(self, window=10, min_flips=2):
+        """
+        Find tests that have switched between passing and failing within
+        the latest runs
+
+        Args:
+          window (int): The number of latest runs to consider
+          min_flips (int): The number of switches needed to be reported
+
+        Returns:
+          list: A list of (classname, name, number of switches), most
+                switches first
+        """
+        runs = self._latest_runs(window)
+        if len(runs) < 2:
+            return []
+        first = runs[-1]
+        # Only cases with both outcomes in the window can have flipped
+        query = """
+        SELECT r.case_id, r.passed, c.classname, c.name
+        FROM results AS r
+        JOIN cases AS c ON c.id = r.case_id
+        WHERE r.case_id IN (SELECT case_id FROM results WHERE run_id >= ?
+                            GROUP BY case_id
+                            HAVING MIN(passed) = 0 AND MAX(passed) = 1)
+              AND r.run_id >= ?
+        ORDER BY r.case_id, r.run_id
+        """
+        flaky = []
+        current, previous, flips = None, None, 0
+        for case_id, passed, classname, name in \
+                self.connection.execute(query, (first, first)):
+            if case_id != current:
+                if current is not None and flips >= min_flips:
+                    flaky.append(case + (flips,))
+                current, previous, flips = case_id, passed, 0
+                case = (classname, name)
+            elif passed != previous:
+                flips += 1
+                previous = passed
+        if current is not None and flips >= min_flips:
+            flaky.append(case + (flips,))
+        flaky.sort(key=lambda item: item[2], reverse=True)
+        return flaky
+
+    def prune(self, keep_runs):
+        """
+        Remove all but the given number of latest runs along with any
+        cases that no longer have results
+
+        Args:
+          keep_runs (int): The number of runs to keep. If this is zero or
+                           less then every run is kept
+        """
+        if keep_runs <= 0:
+            return
+        runs = self._latest_runs(keep_runs)
+        if len(runs) < keep_runs:
+            return
+        oldest = runs[-1]
+        with self.connection:
+            self.connection.execute("DELETE FROM results WHERE run_id < ?",
+                                    (oldest,))
+            self.connection.execute("DELETE FROM runs WHERE id < ?", (oldest,))
+            self.connection.execute("DELETE FROM cases WHERE id NOT IN "
+                                    "(SELECT DISTINCT case_id FROM results)")
+
+    def _latest_runs(self, count):
+        """
+        Returns the identifiers of the given number of latest runs, newest first
+        """
+        rows = self.connection.execute("SELECT id FROM runs ORDER BY id DESC "
+                                       "LIMIT ?", (count,))
+        return [row[0] for row in rows]
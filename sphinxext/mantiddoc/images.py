@@ -0,0 +1,305 @@
+"""
+    Image pipeline for algorithm pages. Each image on a page holding an
+    ..algorithm:: directive is downscaled to a thumbnail and a web-sized
+    variant, and the page refers to them with an HTML <img srcset> rather
+    than to the original file. The variants are named by the hash of the
+    original's content and cached in the doctree directory, so only new or
+    changed images are processed in later builds.
+
+    Processing requires PIL, e.g. Pillow. Without it images are left for
+    Sphinx to copy as they are.
+"""
+from docutils import nodes
+from hashlib import md5
+from sphinx.util.osutil import relative_uri
+from xml.sax.saxutils import escape
+from util import load_pickle, parallel_map
+import os
+import shutil
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Directory, relative to the doctree directory, that caches the variants
+IMAGE_CACHE_DIR = "algorithm-images"
+# Name of the file in the cache directory holding the index of the cache
+IMAGE_INDEX_FILE = "index.pickle"
+# Directory of the HTML output that Sphinx copies images to
+IMAGE_OUTPUT_DIR = "_images"
+# Formats that are re-encoded. Anything else is left to Sphinx
+FORMATS = {".png": "PNG", ".jpg": "JPEG", ".jpeg": "JPEG"}
+
+class ImageCache(object):
+    """
+    Index of the image variants held in the cache directory. It maps each
+    source image to the hash of its content, which is only recomputed when
+    the file's modification time or size change, and each hash to the
+    variants produced from it.
+    """
+
+    def __init__(self, dirname):
+        """
+        Loads the index of the cache in the given directory if there is one
+
+        Args:
+          dirname (str): The cache directory
+        """
+        self.dirname = dirname
+        # path -> (mtime, size, hash) and hash -> list of (filename, width, height)
+        self.sources, self.variants = \
+            load_pickle(os.path.join(dirname, IMAGE_INDEX_FILE), ({}, {}))
+
+    def content_hash(self, path):
+        """
+        Returns the hash of the content of the given image
+        """
+        stat = os.stat(path)
+        entry = self.sources.get(path)
+        if entry is not None and entry[:2] == (stat.st_mtime, stat.st_size):
+            return entry[2]
+        digest = md5()
+        with open(path, "rb") as image:
+            for block in iter(lambda: image.read(1 << 20), b""):
+                digest.update(block)
+        digest = digest.hexdigest()
+        self.sources[path] = (stat.st_mtime, stat.st_size, digest)
+        return digest
+
+    def cached_variants(self, digest):
+        """
+        Returns the variants of the image with the given hash or None if
+        they are not all in the cache
+        """
+        variants = self.variants.get(digest)
+        if variants is None:
+            return None
+        for filename, _, _ in variants:
+            if not os.path.exists(os.path.join(self.dirname, filename)):
+                return None
+        return variants
+
+    def prune(self, paths, digests):
+        """
+        Forget all but the given source paths & hashes and delete the
+        variants of any other hash from the cache directory
+        """
+        self.sources = dict((path, entry) for path, entry
+                            in self.sources.items() if path in paths)
+        for digest in list(self.variants):
+            if digest in digests:
+                continue
+            for filename, _, _ in self.variants.pop(digest):
+                filename = os.path.join(self.dirname, filename)
+                if os.path.exists(filename):
+                    os.remove(filename)
+
+    def save(self):
+        """
+        Write the index of the cache
+        """
+        with open(os.path.join(self.dirname, IMAGE_INDEX_FILE), "wb") as index:
+            pickle.dump((self.sources, self.variants), index,
+                        pickle.HIGHEST_PROTOCOL)
+
+#------------------------------------------------------------------------------
+
+def make_variants(job):
+    """
+    Writes a downscaled copy of an image for each of the given widths. An
+    image narrower than a width is re-encoded at its own size and widths
+    that would give the same image are dropped. Runs in a worker process.
+
+    Arguments:
+      job (tuple): (source path, cache directory, content hash, widths,
+                    JPEG quality)
+
+    Returns:
+      list: A list of (filename, width, height) in the cache directory,
+            narrowest first, or None if the image could not be read
+    """
+    path, dirname, digest, widths, quality = job
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        original = Image.open(path)
+        original.load()
+    except Exception:
+        return None
+    variants = []
+    for width in sorted(set(min(width, original.size[0])
+                            for width in widths)):
+        height = max(1, int(round(original.size[1] * width /
+                                  float(original.size[0]))))
+        image = original
+        if width < original.size[0]:
+            image = original.resize((width, height),
+                                    getattr(Image, "LANCZOS", Image.ANTIALIAS))
+        filename = "%s-%d%s" % (digest, width, extension)
+        options = {"optimize": True}
+        if FORMATS[extension] == "JPEG":
+            options.update(quality=quality, progressive=True)
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+        image.save(os.path.join(dirname, filename), FORMATS[extension],
+                   **options)
+        variants.append((filename, width, height))
+    return variants
+
+def algorithm_images(env):
+    """
+    Returns the images used by algorithm pages that the pipeline handles
+
+    Returns:
+      list: Paths of the images relative to the source directory
+    """
+    pages = env.domaindata.get("algm", {}).get("pages", {})
+    images = []
+    for path, (docnames, _) in env.images.items():
+        if os.path.splitext(path)[1].lower() not in FORMATS:
+            continue
+        if any(docname in pages for docname in docnames):
+            images.append(path)
+    return images
+
+def process_algorithm_images(app, env):
+    """
+    Callback for the 'env-updated' Sphinx event. Makes sure the variants of
+    every image on an algorithm page are in the cache, processing those that
+    are not in a pool of worker processes, and copies them to the output.
+    The variants of each image are stored in app.algorithm_image_variants
+    for replace_algorithm_images.
+
+    Arguments:
+      app: A Sphinx application object
+      env: The build environment
+    """
+    app.algorithm_image_variants = {}
+    if not hasattr(app.builder, "handle_page"):
+        return
+    images = algorithm_images(env)
+    if not images:
+        return
+    if Image is None:
+        app.warn("PIL is not available, images on algorithm pages are "
+                 "copied unprocessed")
+        return
+
+    cachedir = os.path.join(app.doctreedir, IMAGE_CACHE_DIR)
+    if not os.path.isdir(cachedir):
+        os.makedirs(cachedir)
+    cache = ImageCache(cachedir)
+    widths = (app.config.algorithm_image_thumbnail_width,
+              app.config.algorithm_image_web_width)
+    digests, jobs = {}, []
+    for path in images:
+        fullpath = os.path.join(env.srcdir, path)
+        if not os.path.exists(fullpath):
+            continue
+        digest = cache.content_hash(fullpath)
+        digests[path] = digest
+        if cache.cached_variants(digest) is None:
+            jobs.append((fullpath, cachedir, digest, widths,
+                         app.config.algorithm_image_quality))
+
+    results = parallel_map(make_variants, jobs,
+                           app.config.algorithm_image_workers, chunksize=1)
+    for job, variants in zip(jobs, results):
+        if variants is None:
+            app.warn("could not read image %s" % job[0])
+        else:
+            cache.variants[job[2]] = variants
+    if jobs:
+        app.info("processed %d of %d algorithm images"
+                 % (len(jobs), len(digests)))
+
+    outdir = os.path.join(app.outdir, IMAGE_OUTPUT_DIR)
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+    for path, digest in digests.items():
+        variants = cache.variants.get(digest)
+        if variants is None:
+            continue
+        app.algorithm_image_variants[path] = variants
+        # The names include the hash so an existing file is up to date
+        for filename, _, _ in variants:
+            target = os.path.join(outdir, filename)
+            if not os.path.exists(target):
+                shutil.copyfile(os.path.join(cachedir, filename), target)
+    cache.prune(set(os.path.join(env.srcdir, path) for path in digests),
+                set(digests.values()))
+    cache.save()
+
+def replace_algorithm_images(app, doctree, docname):
+    """
+    Callback for the 'doctree-resolved' Sphinx event. Replaces each image
+    with processed variants by an <img> with a srcset listing them, so
+    the original is not copied to the output.
+
+    Arguments:
+      app: A Sphinx application object
+      doctree: The resolved document tree
+      docname (str): The name of the document
+    """
+    variants = getattr(app, "algorithm_image_variants", None)
+    if not variants:
+        return
+    imgpath = relative_uri(app.builder.get_target_uri(docname),
+                           IMAGE_OUTPUT_DIR)
+    for node in doctree.traverse(nodes.image):
+        images = variants.get(node['uri'])
+        if images is None:
+            continue
+        node.replace_self(nodes.raw('', srcset_html(node, images, imgpath),
+                                    format='html'))
+
+def srcset_html(node, variants, imgpath):
+    """
+    Returns the <img> element for an image node given its variants
+
+    Args:
+      node: The image node
+      variants (list): A list of (filename, width, height), narrowest first
+      imgpath (str): The URI of the image directory relative to the page
+    """
+    def quote(text):
+        return escape(text, {'"': "&quot;"})
+
+    def uri(filename):
+        return quote(imgpath + "/" + filename)
+
+    web = variants[-1]
+    srcset = ", ".join("%s %dw" % (uri(filename), width)
+                       for filename, width, _ in variants)
+    attributes = [('src', uri(web[0])),
+                  ('srcset', srcset),
+                  ('sizes', "(max-width: %dpx) 100vw, %dpx"
+                   % (web[1], web[1])),
+                  ('alt', quote(node.get('alt', node['uri'])))]
+    classes = list(node.get('classes', []))
+    if node.get('align'):
+        classes.append('align-' + node['align'])
+    if classes:
+        attributes.append(('class', " ".join(classes)))
+    styles = ["%s: %s" % (dimension, quote(node[dimension]))
+              for dimension in ('width', 'height') if dimension in node]
+    if styles:
+        attributes.append(('style', "; ".join(styles)))
+    return "<img %s />" % " ".join('%s="%s"' % item for item in attributes)
+
+#------------------------------------------------------------------------------
+def setup(app):
+    # width in pixels of the thumbnail of each image
+    app.add_config_value('algorithm_image_thumbnail_width', 320, False)
+    # width in pixels of the web-sized variant of each image
+    app.add_config_value('algorithm_image_web_width', 1024, False)
+    # quality of JPEG variants, 1-95
+    app.add_config_value('algorithm_image_quality', 85, False)
+    # number of processes used to process images. 0 processes them serially
+    app.add_config_value('algorithm_image_workers', 0, False)
+    # connect events to handlers
+    app.connect("env-updated", process_algorithm_images)
+    app.connect("doctree-resolved", replace_algorithm_images)
@@ -0,0 +1,119 @@
+/*
+ * algsearch.js
+ * ~~~~~~~~~~~~
+ *
+ * Looks up algorithms in the search index written by mantiddoc.algsearch.
+ * The manifest is fetched once and then only the shards that can contain
+ * matches for a query are fetched, using the hash of each shard in its URL
+ * so that an old copy is never used from a cache.
+ *
+ * Any <input class="algorithm-search"> on the page is given a list of the
+ * algorithms whose name or one of whose aliases starts with its text.
+ */
+var AlgorithmSearch = {
+
+  SEARCH_DIR : '_algsearch/',
+  MAX_RESULTS : 50,
+
+  _manifest : null,
+  _shards : {},
+
+  root : function() {
+    return DOCUMENTATION_OPTIONS.URL_ROOT;
+  },
+
+  /* Matches mantiddoc.algsearch.shard_prefix */
+  prefix : function(term, length) {
+    return term.substr(0, length).toLowerCase().replace(/[^a-z0-9]/g, '_');
+  },
+
+  manifest : function() {
+    if (!this._manifest) {
+      this._manifest = $.getJSON(this.root() + this.SEARCH_DIR + 'manifest.json');
+    }
+    return this._manifest;
+  },
+
+  shard : function(prefix, hash) {
+    if (!this._shards[prefix]) {
+      this._shards[prefix] = $.getJSON(this.root() + this.SEARCH_DIR +
+                                       prefix + '.json?v=' + hash);
+    }
+    return this._shards[prefix];
+  },
+
+  /* Calls callback with the entries matching the query, sorted by name */
+  query : function(text, callback) {
+    var self = this;
+    var query = $.trim(text).toLowerCase();
+    if (!query) {
+      callback([]);
+      return;
+    }
+    this.manifest().done(function(manifest) {
+      var wanted = self.prefix(query, manifest.prefix_length);
+      // a query shorter than the prefix needs every shard starting with it
+      var requests = $.map(manifest.shards, function(hash, prefix) {
+        return prefix.indexOf(wanted) === 0 ? self.shard(prefix, hash) : null;
+      });
+      if (!requests.length) {
+        callback([]);
+        return;
+      }
+      $.when.apply($, requests).done(function() {
+        var shards = requests.length == 1 ? [arguments] : arguments;
+        var seen = {};
+        var results = [];
+        $.each(shards, function(_, response) {
+          $.each(response[0], function(_, entry) {
+            if (seen[entry.uri] || !self.matches(entry, query)) return;
+            seen[entry.uri] = true;
+            results.push(entry);
+          });
+        });
+        results.sort(function(a, b) {
+          var x = a.name.toLowerCase(), y = b.name.toLowerCase();
+          return x < y ? -1 : (x > y ? 1 : 0);
+        });
+        callback(results);
+      });
+    });
+  },
+
+  matches : function(entry, query) {
+    var terms = [entry.name].concat(entry.aliases);
+    for (var i = 0; i < terms.length; i++) {
+      if (terms[i].toLowerCase().indexOf(query) === 0) return true;
+    }
+    return false;
+  },
+
+  attach : function(input) {
+    var self = this;
+    var list = $('<ul class="algorithm-search-results"></ul>');
+    input.after(list);
+    input.on('input', function() {
+      var text = input.val();
+      self.query(text, function(results) {
+        // ignore the results of a query that has since been replaced
+        if (input.val() !== text) return;
+        list.empty();
+        $.each(results.slice(0, self.MAX_RESULTS), function(_, entry) {
+          var item = $('<li></li>');
+          $('<a></a>').attr('href', self.root() + entry.uri)
+                      .text(entry.name).appendTo(item);
+          if (entry.summary) {
+            item.append(document.createTextNode(' - ' + entry.summary));
+          }
+          list.append(item);
+        });
+      });
+    });
+  }
+};
+
+$(document).ready(function() {
+  $('input.algorithm-search').each(function() {
+    AlgorithmSearch.attach($(this));
+  });
+});
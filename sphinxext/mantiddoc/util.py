@@ -0,0 +1,68 @@
+"""
+    Helpers shared by the mantiddoc extensions for running work in a pool
+    of processes and loading the caches they keep between builds.
+"""
+import os
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+def parallel_map(func, jobs, nworkers, chunksize=None):
+    """
+    Returns the result of calling the function on each job, in order. The
+    jobs are run in a pool of worker processes if there is more than one
+    of them and nworkers is greater than zero, otherwise in this process.
+
+    Args:
+      func: A function of a single job. It must be defined at the top level
+            of a module so that it can be sent to the workers
+      jobs (list): The argument of each call
+      nworkers (int): The number of worker processes
+      chunksize (int): The number of jobs sent to a worker at once. Defaults
+                       to that chosen by multiprocessing
+
+    Returns:
+      list: The result of each job
+    """
+    jobs = list(jobs)
+    if nworkers < 1 or len(jobs) < 2:
+        return [func(job) for job in jobs]
+    from multiprocessing import Pool
+    pool = Pool(nworkers)
+    try:
+        return pool.map(func, jobs, chunksize=chunksize)
+    finally:
+        pool.close()
+        pool.join()
+
+def load_cache(load, default):
+    """
+    Returns the result of a function that reads a cache, or the default if
+    the function fails. A corrupt or incompatible cache, e.g. one written by
+    another version of Python, is then simply rebuilt.
+
+    Args:
+      load: A function of no arguments that returns the cached value
+      default: The value returned if the cache cannot be read
+    """
+    try:
+        return load()
+    except Exception:
+        return default
+
+def load_pickle(filename, default):
+    """
+    Returns the object pickled in the given file, or the default if the
+    file does not exist or cannot be read, see load_cache
+
+    Args:
+      filename (str): The name of the file
+      default: The value returned if the file cannot be read
+    """
+    if not os.path.exists(filename):
+        return default
+    def load():
+        with open(filename, "rb") as cache:
+            return pickle.load(cache)
+    return load_cache(load, default)
@@ -0,0 +1,295 @@
+"""
+    Keeps a Sphinx application, along with its environment, algorithm
+    metadata cache and templates, loaded in memory and rebuilds only what
+    a change to a source file affects.
+
+    Command line usage
+    ~~~~~~~~~~~~~~~~~~
+
+    The sphinxext directory must be importable, e.g.
+
+        PYTHONPATH=sphinxext python -m mantiddoc.watch -d build/doctrees source build/html
+
+    The output is first brought up to date as with sphinx-build. The source
+    directory is then polled and when a document is saved only that
+    document is re-read and written, together with any document outdated
+    by it and the category pages it touches. Documents whose toctree
+    includes it are only rewritten when its title or sections change.
+
+    The general index, search index and static files are not refreshed
+    while watching. They, and the pickled environment, are written once when
+    the watch is stopped with Ctrl-C.
+"""
+import os
+import sys
+import time
+
+from sphinx.application import Sphinx, ENV_PICKLE_FILENAME
+
+class WarmBuilder(object):
+    """
+    Rebuilds the given source files of an already initialized Sphinx
+    application
+    """
+
+    def __init__(self, app):
+        """
+        Args:
+          app: A Sphinx application object that has completed a build
+        """
+        self.app = app
+        # True once the in-memory environment differs from the pickled one
+        self.dirty = False
+        # Search indexer kept between rebuilds, loaded from disk on first use
+        self.indexer = None
+        # Titles & tables of contents of the changed documents before reading
+        self.tocs = {}
+
+    def rebuild(self, filenames):
+        """
+        Re-read and write the given source files along with anything that
+        Sphinx finds to be outdated by them
+
+        Args:
+          filenames (list): Absolute paths of the changed source files
+        """
+        app, builder = self.app, self.app.builder
+        env = app.env
+        self.tocs = {}
+        for filename in filenames:
+            docname = self._docname(filename)
+            if docname in env.all_docs:
+                self.tocs[docname] = _toc_text(env, docname)
+
+        # The environment is pickled once when watching stops
+        patches = [(env, "topickle", _skip_pickle),
+                   (builder, "write", self._write_changed)]
+        if hasattr(builder, "handle_page"):
+            patches.extend([(builder, "finish", self._write_extension_pages),
+                            (builder, "load_indexer", self._load_indexer)])
+        for obj, name, value in patches:
+            setattr(obj, name, value)
+        app.categories_changed_only = True
+        try:
+            builder.build_specific(filenames)
+        finally:
+            for obj, name, _ in patches:
+                delattr(obj, name)
+            app.categories_changed_only = False
+        self.dirty = True
+
+    def close(self):
+        """
+        Write the files skipped while watching, i.e. the environment,
+        indices and static files
+        """
+        if not self.dirty:
+            return
+        app, builder = self.app, self.app.builder
+        app.info("writing environment and indices...")
+        app.env.topickle(os.path.join(app.doctreedir, ENV_PICKLE_FILENAME))
+        builder.finish()
+        app.emit("build-finished", None)
+        builder.cleanup()
+        self.dirty = False
+
+    def _docname(self, filename):
+        """
+        Returns the document name of a source file
+        """
+        docname = os.path.relpath(filename, self.app.srcdir)
+        suffix = self.app.config.source_suffix
+        if docname.endswith(suffix):
+            docname = docname[:-len(suffix)]
+        return docname.replace(os.path.sep, "/")
+
+    def _write_changed(self, build_docnames, updated_docnames, method="update"):
+        """
+        Replaces the builder's write step while watching. Sphinx always
+        writes the master document and the parents in the toctree of each
+        document. Here a parent is only written if the title or table of
+        contents of its child has changed.
+        """
+        env, builder = self.app.env, self.app.builder
+        docnames = (set(build_docnames) | set(updated_docnames)) & \
+            env.found_docs
+        for docname in list(docnames):
+            if docname in self.tocs and \
+                    self.tocs[docname] == _toc_text(env, docname):
+                continue
+            for parent in env.files_to_rebuild.get(docname, []):
+                if parent in env.found_docs:
+                    docnames.add(parent)
+
+        warnings = []
+        env.set_warnfunc(lambda *args: warnings.append(args))
+        builder.prepare_writing(docnames)
+        builder._write_serial(sorted(docnames), warnings)
+        env.set_warnfunc(builder.warn)
+
+    def _load_indexer(self, docnames):
+        """
+        Replaces the HTML builder's loading of the search index while
+        watching so that the file is read only once
+        """
+        builder = self.app.builder
+        if self.indexer is None:
+            type(builder).load_indexer(builder, docnames)
+        else:
+            builder.indexer = self.indexer
+            builder.indexer.prune(set(self.app.env.all_docs) - set(docnames))
+        self.indexer = builder.indexer
+
+    def _write_extension_pages(self):
+        """
+        Replaces the HTML builder's finish step while watching so that only
+        the pages from extensions, e.g. changed categories, are written
+        """
+        builder = self.app.builder
+        for pagelist in self.app.emit("html-collect-pages"):
+            for pagename, context, template in pagelist:
+                builder.handle_page(pagename, context, template)
+
+def _skip_pickle(filename):
+    pass
+
+def _toc_text(env, docname):
+    """
+    Returns the text of the title and table of contents of a document, which
+    is what the toctrees of other documents show of it
+    """
+    title, toc = env.titles.get(docname), env.tocs.get(docname)
+    return (title.astext() if title is not None else None,
+            toc.astext() if toc is not None else None)
+
+#---------------------------------------------------------------------------------
+
+def scan_sources(srcdir, suffix):
+    """
+    Returns the modification times of the source files under a directory
+
+    Args:
+      srcdir (str): The source directory
+      suffix (str): The suffix of source files
+
+    Returns:
+      dict: A dictionary of absolute filename to modification time
+    """
+    mtimes = {}
+    for dirpath, dirnames, filenames in os.walk(srcdir):
+        # skip hidden directories, e.g. editor backups & version control
+        dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+        for name in filenames:
+            if not name.endswith(suffix):
+                continue
+            filename = os.path.join(dirpath, name)
+            try:
+                mtimes[filename] = os.stat(filename).st_mtime
+            except OSError:
+                # removed between listing & stat
+                pass
+    return mtimes
+
+def changed_sources(previous, current):
+    """
+    Returns the files that are new or modified in the current scan. Removed
+    files are left for Sphinx to notice.
+
+    Args:
+      previous (dict): The result of an earlier scan_sources
+      current (dict): The result of the latest scan_sources
+
+    Returns:
+      list: A sorted list of filenames
+    """
+    return sorted(filename for filename, mtime in current.items()
+                  if previous.get(filename) != mtime)
+
+def watch(app, interval=0.2):
+    """
+    Poll the source directory of the application and rebuild whatever
+    changes until interrupted
+
+    Args:
+      app: A Sphinx application object that has completed a build
+      interval (float): Seconds between scans of the source directory
+    """
+    builder = WarmBuilder(app)
+    suffix = app.config.source_suffix
+    mtimes = scan_sources(app.srcdir, suffix)
+    app.info("watching %d source files in %s, press Ctrl-C to stop"
+             % (len(mtimes), app.srcdir))
+    try:
+        while True:
+            time.sleep(interval)
+            current = scan_sources(app.srcdir, suffix)
+            changed = changed_sources(mtimes, current)
+            removed = set(mtimes) - set(current)
+            mtimes = current
+            if not changed and not removed:
+                continue
+            start = time.time()
+            try:
+                builder.rebuild(changed)
+            except Exception as exc:
+                # keep watching, the next save may fix it
+                app.warn("rebuild failed: %s" % exc)
+                continue
+            app.info("rebuilt %d changed file(s) in %.2fs"
+                     % (len(changed), time.time() - start))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        builder.close()
+
+#---------------------------------------------------------------------------------
+
+def main(argv=None):
+    """
+    Entry point for running the module from the command line
+
+    Args:
+      argv (list): The command line arguments. Defaults to sys.argv[1:]
+
+    Returns:
+      int: The exit code
+    """
+    import argparse
+
+    cmdline = argparse.ArgumentParser(prog="python -m mantiddoc.watch",
+                                      description="Build the documentation "
+                                      "and rebuild changed pages until "
+                                      "interrupted")
+    cmdline.add_argument("sourcedir", help="directory containing conf.py")
+    cmdline.add_argument("outdir", help="output directory")
+    cmdline.add_argument("-b", dest="builder", default="html",
+                         help="builder to use (default: html)")
+    cmdline.add_argument("-d", dest="doctreedir",
+                         help="directory for the environment and doctrees "
+                         "(default: OUTDIR/.doctrees)")
+    cmdline.add_argument("-D", dest="overrides", action="append", default=[],
+                         metavar="setting=value",
+                         help="override a setting in conf.py")
+    cmdline.add_argument("--interval", type=float, default=0.2,
+                         help="seconds between scans of the source directory")
+    args = cmdline.parse_args(argv)
+
+    confoverrides = {}
+    for override in args.overrides:
+        key, _, value = override.partition("=")
+        confoverrides[key] = value
+    srcdir = os.path.abspath(args.sourcedir)
+    outdir = os.path.abspath(args.outdir)
+    doctreedir = os.path.abspath(args.doctreedir or
+                                 os.path.join(outdir, ".doctrees"))
+
+    app = Sphinx(srcdir, srcdir, outdir, doctreedir, args.builder,
+                 confoverrides, sys.stdout, sys.stderr)
+    # Not app.build() as that also cleans up the builder's theme
+    app.builder.build_update()
+    app.emit("build-finished", None)
+    watch(app, args.interval)
+    return app.statuscode
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+    Tests of running doctest documents in forked processes with
+    mantiddoc.doctest. Run from the top of the repository with
+
+        python -m unittest discover tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, "sphinxext"))
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+from sphinx.application import Sphinx
+
+CONF = """
+extensions = ['sphinx.ext.doctest', 'mantiddoc.doctest']
+master_doc = 'index'
+doctest_global_setup = 'data = []'
+"""
+
+# Group A changes the list made by the global setup code, which group B
+# must not see
+INDEX = """
+Isolation
+=========
+
+.. doctest:: A
+
+   >>> data.append(1)
+   >>> len(data)
+   1
+
+.. doctest:: B
+
+   >>> len(data)
+   0
+"""
+
+# The second example of group A exceeds the time limit after the first
+# has passed
+TIMEOUT_INDEX = """
+Timeout
+=======
+
+.. doctest:: A
+
+   >>> 1 + 1
+   2
+   >>> import time; time.sleep(5)
+
+.. doctest:: B
+
+   >>> 2 + 2
+   4
+"""
+
+class ForkedDocTestRunnerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.srcdir = os.path.join(self.tmpdir, "src")
+        os.mkdir(self.srcdir)
+        with open(os.path.join(self.srcdir, "conf.py"), "w") as conf:
+            conf.write(CONF)
+        with open(os.path.join(self.srcdir, "index.rst"), "w") as index:
+            index.write(INDEX)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def build(self, fork_workers, **overrides):
+        outdir = os.path.join(self.tmpdir, "out%d" % fork_workers)
+        overrides["doctest_fork_workers"] = fork_workers
+        app = Sphinx(self.srcdir, self.srcdir, outdir,
+                     os.path.join(outdir, ".doctrees"), "doctest",
+                     overrides, StringIO(), StringIO(), freshenv=True)
+        app.build()
+        return app
+
+    def test_serial_groups_do_not_share_setup_objects(self):
+        app = self.build(0)
+        self.assertEqual(app.builder.total_failures, 0)
+        self.assertEqual(app.statuscode, 0)
+
+    def test_forked_groups_do_not_share_setup_objects(self):
+        app = self.build(1)
+        self.assertEqual(app.builder.total_failures, 0)
+        self.assertEqual(app.statuscode, 0)
+
+    def test_failing_global_setup_is_a_setup_failure_when_forked(self):
+        broken = {"doctest_global_setup": "import not_a_module"}
+        serial = self.build(0, **broken)
+        forked = self.build(1, **broken)
+        self.assertTrue(serial.builder.setup_failures > 0)
+        self.assertEqual(forked.builder.setup_failures,
+                         serial.builder.setup_failures)
+        self.assertEqual(forked.statuscode, 1)
+        self.assertTrue(os.path.exists(os.path.join(forked.outdir,
+                                                    "TEST-doctest.xml")))
+
+    def test_examples_before_a_timeout_are_reported(self):
+        with open(os.path.join(self.srcdir, "index.rst"), "w") as index:
+            index.write(TIMEOUT_INDEX)
+        app = self.build(1, doctest_example_timeout=0.5)
+        self.assertEqual(app.builder.total_tries, 2)
+        with open(os.path.join(app.outdir, "TEST-doctest.xml")) as xunit:
+            results = xunit.read()
+        self.assertTrue('tests="3"' in results)
+        self.assertTrue('type="Timeout"' in results)
+        # the error follows the cases of its group
+        self.assertTrue(results.index('name="A"') < results.index('Timeout')
+                        < results.index('name="B"'))
+
+if __name__ == "__main__":
+    unittest.main()